@@ -2,16 +2,39 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 
+from app.metrics import TimedQueuePool
+
 app = Flask(__name__)
 app.config.from_object('app.config.Config')
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"poolclass": TimedQueuePool, **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})}
 db = SQLAlchemy(app)
 CORS(app)
 
 def create_app():
   from app.routes import register_blueprints
-  from app.middleware import register_versioning_events
+  from app.auth import register_auth_events, start_permission_listener
+  from app.bot import update_queue
+  from app.choices import register_choice_events, start_choice_listener
+  from app.middleware import register_versioning_events, schema_registry
+  from app.migrations import register_commands
+  from app.instrumentation import register_instrumentation
+  from app.metrics import register_metrics
+  from app.response_cache import register_response_cache_events, start_listener
   register_blueprints(app)
+  register_commands(app)
   with app.app_context():
+    if app.config["SQL_INSTRUMENTATION"]:
+      register_instrumentation(app, db.engine)
+    if app.config["METRICS_ENABLED"]:
+      register_metrics(app, db.engine)
     register_versioning_events()
+    register_choice_events()
+    register_auth_events()
+    register_response_cache_events()
     db.create_all()
+    start_listener()
+    start_permission_listener()
+    start_choice_listener()
+  schema_registry.start(app)
+  update_queue.start(app)
   return app
\ No newline at end of file
@@ -0,0 +1,92 @@
+import datetime
+import hashlib
+import hmac
+import time
+
+from sqlalchemy import func, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from .cache import TTLCache, invalidate_on_commit
+from .config import Config
+from .models import Permission, Role, TelegramID, User
+from .notify import Listener, notify
+
+permission_cache = TTLCache(Config.PERMISSION_CACHE_SIZE, Config.PERMISSION_CACHE_TTL)
+
+
+def verify_telegram(data):
+    # https://core.telegram.org/widgets/login#checking-authorization
+    received = data.get("hash")
+    if not Config.TELEGRAM_BOT_TOKEN or not isinstance(received, str):
+        return False
+    check = "\n".join(f"{key}={data[key]}" for key in sorted(data) if key != "hash" and data[key] is not None)
+    secret = hashlib.sha256(Config.TELEGRAM_BOT_TOKEN.encode()).digest()
+    expected = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        return False
+    try:
+        auth_date = int(data["auth_date"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return time.time() - auth_date <= Config.TELEGRAM_AUTH_MAX_AGE
+
+
+def upsert_telegram_user(data):
+    # One statement: the TelegramID row is inserted or refreshed, the default
+    # role is created if missing and a User row is inserted on first login.
+    # Existing users and roles are only read, so a repeated login does not
+    # rewrite (and lock) them.
+    values = {
+        "telegram_id": str(data["id"]),
+        "first_name": data.get("first_name") or "",
+        "last_name": data.get("last_name"),
+        "username": data.get("username") or "",
+        "photo_url": data.get("photo_url"),
+        "auth_date": datetime.datetime.fromtimestamp(int(data["auth_date"]), datetime.timezone.utc).replace(tzinfo=None),
+        "hash_value": data["hash"],
+    }
+    telegram = pg_insert(TelegramID).values(values)
+    telegram = telegram.on_conflict_do_update(
+        index_elements=[TelegramID.telegram_id],
+        set_={key: telegram.excluded[key] for key in values if key != "telegram_id"},
+    ).returning(TelegramID.id).cte("telegram")
+    new_role = pg_insert(Role).values(name=Config.TELEGRAM_DEFAULT_ROLE).on_conflict_do_nothing().returning(Role.id).cte("new_role")
+    role_id = func.coalesce(select(new_role.c.id).scalar_subquery(), select(Role.id).where(Role.name == Config.TELEGRAM_DEFAULT_ROLE).scalar_subquery())
+    name = " ".join(part for part in (values["first_name"], values["last_name"]) if part) or values["username"]
+    new_user = pg_insert(User).from_select(["telegramid_id", "role_id", "name"], select(telegram.c.id, role_id, literal(name)))
+    new_user = new_user.on_conflict_do_nothing().returning(User.id, User.role_id).cte("new_user")
+    statement = select(new_user.c.id, new_user.c.role_id).union_all(
+        select(User.id, User.role_id).join(telegram, User.telegramid_id == telegram.c.id)
+    )
+    row = db.session.execute(statement).first()
+    return row.id, row.role_id
+
+
+def permissions_for(user_id):
+    permissions = permission_cache.get(user_id)
+    if permissions is None:
+        names = db.session.scalars(
+            select(Permission.name).join(Role, Role.id == Permission.role_id).join(User, User.role_id == Role.id).where(User.id == user_id)
+        )
+        permissions = frozenset(names)
+        permission_cache.set(user_id, permissions)
+    return permissions
+
+
+def _invalidate_permissions(tables):
+    # Other workers hold their own cache and hear about it through NOTIFY.
+    permission_cache.clear()
+    if db.engine.dialect.name == "postgresql":
+        notify(db.engine, _listener.channel, ",".join(sorted(tables)))
+
+
+_listener = Listener("permission_cache", lambda message: permission_cache.clear(), permission_cache.clear)
+
+
+def start_permission_listener():
+    _listener.start(db.engine)
+
+
+def register_auth_events():
+    invalidate_on_commit(db.session, (User, Role, Permission), _invalidate_permissions)
@@ -0,0 +1,112 @@
+from sqlalchemy import delete, insert, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from .models import VersionModel
+from .validation import model_validator
+
+operations = ("create", "update", "upsert", "delete")
+
+
+def _invalid(index, operation, reason):
+    return {"index": index, "op": operation.get("op") if isinstance(operation, dict) else None, "status": "invalid", "reason": reason}
+
+
+def _validate(index, operation, validator, on, versioned):
+    # (operation with coerced values, None) or (None, invalid result). Values
+    # go through the model's validator like single-row writes: creates and
+    # upserts must name every column without a default, updates any subset.
+    if not isinstance(operation, dict):
+        return None, _invalid(index, operation, "operation should be an object")
+    op = operation.get("op")
+    if op not in operations:
+        return None, _invalid(index, operation, f"op should be one of {', '.join(operations)}")
+    if op in ("update", "delete") and not isinstance(operation.get("id"), int):
+        return None, _invalid(index, operation, "id should be an integer")
+    if op == "delete":
+        return operation, None
+    values = operation.get("values")
+    if not isinstance(values, dict) or not values:
+        return None, _invalid(index, operation, "values should be a non-empty object")
+    if op == "upsert" and versioned:
+        return None, _invalid(index, operation, "upsert is not available for versioned models, use create or update")
+    if op == "upsert" and any(key not in values for key in on):
+        return None, _invalid(index, operation, f"upsert values should contain {', '.join(on)}")
+    row = {key: value for key, value in values.items() if not (op == "upsert" and key == "id")}
+    coerced, error = validator.coerce(row, full=op != "update")
+    if error:
+        result = _invalid(index, operation, f"{error['reason']}: {', '.join(error['keys'])}")
+        result["keys"] = error["keys"]
+        return None, result
+    if op == "upsert" and "id" in values:
+        coerced["id"] = values["id"]
+    return {**operation, "values": coerced}, None
+
+
+def _group_by_keys(items):
+    groups = {}
+    for index, values in items:
+        groups.setdefault(tuple(sorted(values)), []).append((index, values))
+    return groups.values()
+
+
+def apply_batch(model_class, batch, on=("id",)):
+    # Runs every operation set-based inside the caller's transaction and
+    # returns one result per input operation, in input order.
+    table = model_class.__table__
+    validator = model_validator(model_class)
+    versioned = issubclass(model_class, VersionModel)
+    results = [None] * len(batch)
+    grouped = {op: [] for op in operations}
+    for index, operation in enumerate(batch):
+        operation, results[index] = _validate(index, operation, validator, on, versioned)
+        if operation is not None:
+            grouped[operation["op"]].append((index, operation))
+
+    for group in _group_by_keys((index, operation["values"]) for index, operation in grouped["create"]):
+        ids = db.session.scalars(insert(model_class).returning(model_class.id, sort_by_parameter_order=True), [values for _, values in group]).all()
+        for (index, _), new_id in zip(group, ids):
+            results[index] = {"index": index, "op": "create", "id": new_id, "status": "created"}
+
+    for group in _group_by_keys((index, operation["values"]) for index, operation in grouped["upsert"]):
+        statement = pg_insert(table).values([values for _, values in group])
+        keys = group[0][1].keys()
+        set_ = {key: statement.excluded[key] for key in keys if key not in on} or {on[0]: statement.excluded[on[0]]}
+        statement = statement.on_conflict_do_update(index_elements=list(on), set_=set_).returning(
+            table.c.id, literal_column("xmax = 0").label("inserted"), *[table.c[key] for key in on]
+        )
+        returned = {tuple(str(value) for value in row[2:]): row for row in db.session.execute(statement)}
+        for index, values in group:
+            row = returned.get(tuple(str(values[key]) for key in on))
+            if row is None:
+                results[index] = {"index": index, "op": "upsert", "status": "invalid", "reason": "conflict key did not match the stored value"}
+            else:
+                results[index] = {"index": index, "op": "upsert", "id": row[0], "status": "created" if row[1] else "updated"}
+
+    updates = grouped["update"]
+    if updates and issubclass(model_class, VersionModel):
+        # Versioned rows go through the unit of work so the version counter
+        # and history rows are written at flush time.
+        objects = {obj.id: obj for obj in db.session.scalars(select(model_class).where(model_class.id.in_([operation["id"] for _, operation in updates])))}
+        existing = set(objects)
+        for _, operation in updates:
+            if operation["id"] in objects:
+                for key, value in operation["values"].items():
+                    setattr(objects[operation["id"]], key, value)
+        db.session.flush()
+    elif updates:
+        existing = set(db.session.scalars(select(model_class.id).where(model_class.id.in_([operation["id"] for _, operation in updates]))))
+        found = [(index, operation) for index, operation in updates if operation["id"] in existing]
+        for group in _group_by_keys((index, {"id": operation["id"], **operation["values"]}) for index, operation in found):
+            db.session.execute(update(model_class), [values for _, values in group])
+    for index, operation in updates:
+        status = "updated" if operation["id"] in existing else "not_found"
+        results[index] = {"index": index, "op": "update", "id": operation["id"], "status": status}
+
+    deletes = grouped["delete"]
+    if deletes:
+        deleted = set(db.session.scalars(delete(model_class).where(model_class.id.in_([operation["id"] for _, operation in deletes])).returning(model_class.id)))
+        for index, operation in deletes:
+            status = "deleted" if operation["id"] in deleted else "not_found"
+            results[index] = {"index": index, "op": "delete", "id": operation["id"], "status": status}
+    return results
@@ -0,0 +1,90 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import threading
+
+from sqlalchemy.types import Text, TypeDecorator
+
+from .config import Config
+
+_digest = re.compile(r"[0-9a-f]{64}")
+
+_signatures = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"%PDF", "application/pdf"),
+)
+
+
+def is_digest(value):
+    return isinstance(value, str) and _digest.fullmatch(value) is not None
+
+
+def blob_path(digest):
+    return os.path.join(Config.BLOB_DIR, digest[:2], digest[2:4], digest)
+
+
+def decode_legacy(value):
+    # Rows written before the blob store hold base64 text, sometimes as a
+    # data: URL.
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    try:
+        return base64.b64decode(value, validate=False)
+    except (binascii.Error, ValueError):
+        return value.encode("utf-8")
+
+
+def store_blob(data):
+    # Content addressed: identical images share one file and an existing
+    # file is never rewritten.
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(partial, "wb") as file:
+            file.write(data)
+        os.replace(partial, path)
+    return digest
+
+
+def read_blob(digest):
+    if not is_digest(digest):
+        return None
+    try:
+        with open(blob_path(digest), "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def content_type(path):
+    with open(path, "rb") as file:
+        head = file.read(16)
+    for signature, mimetype in _signatures:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class BlobReference(TypeDecorator):
+    # Stores the SHA-256 of the content instead of the content itself. Binding
+    # raw bytes or legacy base64 text writes the blob and keeps its digest, so
+    # every insert/update path (ORM, executemany, batch) goes through it.
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or is_digest(value):
+            return value
+        if isinstance(value, str):
+            value = decode_legacy(value)
+        return store_blob(bytes(value))
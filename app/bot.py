@@ -0,0 +1,214 @@
+import datetime
+import queue
+import threading
+import time
+
+from sqlalchemy import and_, bindparam, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app import db
+from .batch import apply_batch
+from .config import Config
+from .metrics import Counter, Gauge, registry
+from .models import BotUpdate, Contract, Role, TelegramID, User
+
+bot_updates = Counter("bot_updates_total", "Bot updates by type and outcome.", ("type", "status"))
+
+
+def _upsert_users(updates):
+    # Later updates for the same Telegram user win; Postgres rejects an
+    # ON CONFLICT DO UPDATE that touches one row twice.
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    rows = {}
+    for update in updates:
+        user = update["user"]
+        rows[str(user["id"])] = {
+            "telegram_id": str(user["id"]),
+            "first_name": user.get("first_name") or "",
+            "last_name": user.get("last_name"),
+            "username": user.get("username") or "",
+            "photo_url": user.get("photo_url"),
+            "auth_date": now,
+            "hash_value": "",
+        }
+    statement = pg_insert(TelegramID).values(list(rows.values()))
+    statement = statement.on_conflict_do_update(
+        index_elements=[TelegramID.telegram_id],
+        set_={key: statement.excluded[key] for key in ("first_name", "last_name", "username", "photo_url")},
+    )
+    db.session.execute(statement)
+    db.session.execute(pg_insert(Role).values(name=Config.TELEGRAM_DEFAULT_ROLE).on_conflict_do_nothing())
+    role_id = select(Role.id).where(Role.name == Config.TELEGRAM_DEFAULT_ROLE).scalar_subquery()
+    name = func.coalesce(func.nullif(func.concat_ws(" ", TelegramID.first_name, TelegramID.last_name), ""), TelegramID.username)
+    db.session.execute(
+        pg_insert(User)
+        .from_select(["telegramid_id", "role_id", "name"], select(TelegramID.id, role_id, name).where(TelegramID.telegram_id.in_(list(rows))))
+        .on_conflict_do_nothing()
+    )
+    return ["processed"] * len(updates)
+
+
+def _apply_contracts(updates):
+    results = apply_batch(Contract, [{key: update.get(key) for key in ("op", "id", "values") if key in update} for update in updates])
+    return ["processed" if result["status"] != "invalid" else "invalid" for result in results]
+
+
+handlers = {
+    "user": _upsert_users,
+    "contract": _apply_contracts,
+}
+
+
+def validate_update(update):
+    if not isinstance(update, dict):
+        return "update should be an object"
+    if update.get("type") not in handlers:
+        return f"type should be one of {', '.join(handlers)}"
+    if update["type"] == "user" and not (isinstance(update.get("user"), dict) and update["user"].get("id") is not None):
+        return "user updates need a user object with an id"
+    return None
+
+
+class UpdateQueue:
+    # The webhook stores updates in bot_update before acknowledging them;
+    # update_id is unique there, so Telegram's retries are dropped whichever
+    # worker receives them. New rows go to an in-process queue that worker
+    # threads drain in batches of up to BOT_BATCH_SIZE (or whatever arrived
+    # within BOT_BATCH_WAIT), one transaction per update type that also
+    # records each row's status. A failed batch is retried one update at a
+    # time and the updates that still fail are marked failed. Failed rows and
+    # rows left pending by a process that exited are run again by
+    # flask replay-bot-updates.
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=Config.BOT_QUEUE_SIZE)
+        self._put_lock = threading.Lock()
+        self._workers = []
+        self._app = None
+
+    def start(self, app):
+        self._app = app
+        self.start_workers()
+
+    def start_workers(self):
+        if self._app is None:
+            return
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        for index in range(len(self._workers), Config.BOT_WORKERS):
+            worker = threading.Thread(target=self._work, name=f"bot-updates-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def put(self, updates):
+        # Returns how many updates were accepted, i.e. stored; duplicates of a
+        # stored update_id count as accepted but are not queued again. Only
+        # what fits in the queue is stored, and since put is the only producer
+        # the room can't shrink while the lock is held.
+        with self._put_lock:
+            updates = updates[:self.queue.maxsize - self.queue.qsize()]
+            if not updates:
+                return 0
+            rows = [{"update_id": update.get("update_id"), "type": update["type"], "payload": update} for update in updates]
+            statement = pg_insert(BotUpdate).values(rows).on_conflict_do_nothing(index_elements=[BotUpdate.update_id])
+            stored = db.session.execute(statement.returning(BotUpdate.id, BotUpdate.payload)).all()
+            db.session.commit()
+            for row in stored:
+                self.queue.put_nowait((row.id, row.payload))
+            return len(updates)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + Config.BOT_BATCH_WAIT
+        while len(batch) < Config.BOT_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with self._app.app_context():
+                    self.process(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def process(self, batch):
+        # batch: (bot_update id, update) pairs.
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[1].get("type"), []).append(item)
+        for update_type, items in groups.items():
+            handler = handlers.get(update_type)
+            if handler is None:
+                bot_updates.inc(str(update_type), "unknown", amount=len(items))
+                continue
+            try:
+                statuses = self._apply(handler, items)
+            except Exception:
+                db.session.rollback()
+                self._app.logger.exception("bot %s batch of %d updates failed", update_type, len(items))
+                statuses = self._retry(handler, items) if len(items) > 1 else self._fail(items)
+            finally:
+                db.session.remove()
+            for status in statuses:
+                bot_updates.inc(update_type, status)
+
+    def _apply(self, handler, items):
+        statuses = handler([update for _, update in items])
+        _mark(items, statuses)
+        db.session.commit()
+        return statuses
+
+    def _retry(self, handler, items):
+        statuses = []
+        for item in items:
+            try:
+                statuses.extend(self._apply(handler, [item]))
+            except Exception:
+                db.session.rollback()
+                self._app.logger.exception("bot update %s failed", item[0])
+                statuses.extend(self._fail([item]))
+        return statuses
+
+    def _fail(self, items):
+        try:
+            _mark(items, ["failed"] * len(items))
+            db.session.commit()
+        except Exception:
+            # The rows stay pending; replay-bot-updates picks them up.
+            db.session.rollback()
+            self._app.logger.exception("could not mark %d bot updates failed", len(items))
+        return ["failed"] * len(items)
+
+
+def _mark(items, statuses):
+    table = BotUpdate.__table__
+    statement = update(table).where(table.c.id == bindparam("row_id")).values(status=bindparam("new_status"), attempts=table.c.attempts + 1)
+    db.session.execute(statement, [{"row_id": row_id, "new_status": status} for (row_id, _), status in zip(items, statuses)])
+
+
+def replay_updates(pending_after):
+    # Failed updates, and pending ones older than pending_after seconds (their
+    # process exited before handling them), run again in this process.
+    statement = (
+        select(BotUpdate.id, BotUpdate.payload)
+        .where(or_(BotUpdate.status == "failed", and_(BotUpdate.status == "pending", BotUpdate.received_at < func.now() - datetime.timedelta(seconds=pending_after))))
+        .order_by(BotUpdate.id)
+    )
+    rows = [tuple(row) for row in db.session.execute(statement)]
+    for start in range(0, len(rows), Config.BOT_BATCH_SIZE):
+        update_queue.process(rows[start:start + Config.BOT_BATCH_SIZE])
+    return len(rows)
+
+
+update_queue = UpdateQueue()
+registry.extend([
+    bot_updates,
+    Gauge("bot_queue_depth", "Bot updates waiting to be processed.", update_queue.queue.qsize),
+])
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize)
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        entry = super().get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key, value):
+        super().set(key, (time.monotonic() + self.ttl, value))
+
+
+_invalidators = []
+_tables_key = "written_tables"
+_connections_key = "written_tables_connections"
+_session_key = "written_tables_session"
+
+
+def _begin(session, transaction, connection):
+    connection.info[_session_key] = session
+    # connection.info belongs to the pooled DBAPI connection and outlives
+    # this checkout, so the link is removed again when the transaction ends.
+    session.info.setdefault(_connections_key, []).append(connection.info)
+
+
+def _record(connection, clauseelement, multiparams, params, execution_options, result):
+    # Sees every statement a session runs: unit-of-work flushes, ORM bulk and
+    # Core DML, and DML inside CTEs (INSERT ... RETURNING used as a CTE).
+    session = connection.info.get(_session_key)
+    if session is None:
+        return
+    written = []
+    if getattr(clauseelement, "is_dml", False):
+        written.append(clauseelement.table)
+    compiled = getattr(result.context, "compiled", None)
+    if compiled is not None and compiled.ctes:
+        written.extend(cte.element.table for cte in compiled.ctes if cte.element.is_dml)
+    if written:
+        session.info.setdefault(_tables_key, set()).update(written)
+
+
+def _commit(session):
+    tables = session.info.pop(_tables_key, None)
+    if not tables:
+        return
+    for watched, callback in _invalidators:
+        names = {table.name for table in tables if watched is None or table in watched}
+        if names:
+            callback(names)
+
+
+def _transaction_end(session, transaction):
+    if transaction.parent is not None:
+        return
+    session.info.pop(_tables_key, None)
+    for info in session.info.pop(_connections_key, ()):
+        if info.get(_session_key) is session:
+            del info[_session_key]
+
+
+def invalidate_on_commit(session, classes, callback):
+    # Calls callback(tables) after a commit that inserted, updated or deleted
+    # rows of any of classes (any table when classes is None), with the set of
+    # table names written. Waiting for the commit keeps a concurrent request
+    # from reloading and caching the old rows before they are replaced.
+    # Writes are seen at the connection level rather than through
+    # do_orm_execute, whose mere presence breaks yield_per with selectinload.
+    if not _invalidators:
+        event.listen(session, "after_begin", _begin)
+        event.listen(session, "after_commit", _commit)
+        event.listen(session, "after_transaction_end", _transaction_end)
+        event.listen(Engine, "after_execute", _record)
+    _invalidators.append((None if classes is None else {model_class.__table__ for model_class in classes}, callback))
@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import func, select
+
+from app import db
+from .cache import invalidate_on_commit
+from .config import Config
+from .models import Client, Company, Person, Seller, Subject
+from .notify import Listener, notify
+
+Choice = namedtuple("Choice", ["id", "label"])
+
+
+class ChoiceProvider:
+    # (id, label) pairs for a subject role, loaded in one grouped join and
+    # kept until a Subject/Person/Company/role row changes or the TTL ends.
+    def __init__(self, role_class):
+        self.role_class = role_class
+        self._choices = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        role = self.role_class
+        label = func.coalesce(func.min(Company.legacy_name), func.min(Person.name), Subject.name)
+        statement = (
+            select(role.id, label.label("label"))
+            .join(Subject, Subject.id == role.subject_id)
+            .outerjoin(Company, Company.subject_id == Subject.id)
+            .outerjoin(Person, Person.subject_id == Subject.id)
+            .group_by(role.id, Subject.id, Subject.name)
+            .order_by(label, role.id)
+        )
+        return [Choice(row.id, row.label or f"Subject {row.id}") for row in db.session.execute(statement)]
+
+    def choices(self):
+        with self._lock:
+            if self._choices is None or time.monotonic() - self._loaded_at > Config.CHOICES_TTL:
+                self._choices = self._load()
+                self._loaded_at = time.monotonic()
+            return self._choices
+
+    def search(self, term, limit):
+        term = term.casefold()
+        matches = []
+        for choice in self.choices():
+            if term in choice.label.casefold():
+                matches.append(choice)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def invalidate(self):
+        with self._lock:
+            self._choices = None
+
+
+providers = {
+    "seller": ChoiceProvider(Seller),
+    "client": ChoiceProvider(Client),
+}
+
+watched_classes = (Seller, Client, Person, Company, Subject)
+
+
+def invalidate_choices():
+    for provider in providers.values():
+        provider.invalidate()
+
+
+def _invalidate(tables):
+    # Other workers hold their own choices and hear about it through NOTIFY.
+    invalidate_choices()
+    if db.engine.dialect.name == "postgresql":
+        notify(db.engine, _listener.channel, ",".join(sorted(tables)))
+
+
+_listener = Listener("choices", lambda message: invalidate_choices(), invalidate_choices)
+
+
+def start_choice_listener():
+    _listener.start(db.engine)
+
+
+def register_choice_events():
+    invalidate_on_commit(db.session, watched_classes, _invalidate)
@@ -1,4 +1,6 @@
+import multiprocessing
 import os
+import tempfile
 
 class Config:
     POSTGRE_DBNAME = os.getenv('POSTGRE_DBNAME', 'contract')
@@ -6,10 +8,75 @@ class Config:
     POSTGRE_PASSWORD = os.getenv('POSTGRE_PASSWORD', 'wakeuptoreality')
     POSTGRE_HOST = os.getenv('POSTGRE_HOST', 'localhost')
     POSTGRE_PORT = os.getenv('POSTGRE_PORT', '5432')
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{POSTGRE_USER}:{POSTGRE_PASSWORD}@{POSTGRE_HOST}:{POSTGRE_PORT}/{POSTGRE_DBNAME}"
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f"postgresql://{POSTGRE_USER}:{POSTGRE_PASSWORD}@{POSTGRE_HOST}:{POSTGRE_PORT}/{POSTGRE_DBNAME}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))
+    BOT_WORKERS = int(os.getenv('BOT_WORKERS', '2'))
+    # Upper bound for connections across all processes of one instance. Every
+    # process holds one LISTEN connection outside its pool (app.notify); the
+    # gunicorn master keeps only that one once the app is preloaded. Request
+    # and bot worker threads share a worker's pool.
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', '90'))
+    DB_WORKER_CONNECTIONS = max(2, (DB_MAX_CONNECTIONS - 1) // WEB_WORKERS - 1)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', str(max(1, min(WEB_THREADS + BOT_WORKERS, DB_WORKER_CONNECTIONS)))))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', str(max(0, DB_WORKER_CONNECTIONS - DB_POOL_SIZE))))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true')
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
     ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
     ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'password')
     SECRET_KEY = 'your_secret_key'
-    DEBUG = True
+    DEBUG = os.getenv('DEBUG', 'true').lower() in ('1', 'true')
+    API_PAGE_LIMIT = int(os.getenv('API_PAGE_LIMIT', '100'))
+    API_MAX_PAGE_LIMIT = int(os.getenv('API_MAX_PAGE_LIMIT', '1000'))
+    API_MAX_DEPTH = int(os.getenv('API_MAX_DEPTH', '3'))
+    API_STREAM_BATCH = int(os.getenv('API_STREAM_BATCH', '500'))
+    API_PLAN_CACHE_SIZE = int(os.getenv('API_PLAN_CACHE_SIZE', '256'))
+    JSON_ENCODER = os.getenv('JSON_ENCODER', 'auto')
+    API_BATCH_LIMIT = int(os.getenv('API_BATCH_LIMIT', '5000'))
+    API_SUMMARY_TTL = int(os.getenv('API_SUMMARY_TTL', '30'))
+    SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'true').lower() in ('1', 'true')
+    SQL_DEBUG_DUMP = os.getenv('SQL_DEBUG_DUMP', 'false').lower() in ('1', 'true')
+    SQL_LOG_REPEATED = os.getenv('SQL_LOG_REPEATED', 'false').lower() in ('1', 'true')
+    SQL_REPEAT_THRESHOLD = int(os.getenv('SQL_REPEAT_THRESHOLD', '5'))
+    SQL_SLOWEST_KEPT = int(os.getenv('SQL_SLOWEST_KEPT', '5'))
+    VERSION_SNAPSHOT_INTERVAL = int(os.getenv('VERSION_SNAPSHOT_INTERVAL', '20'))
+    VERSION_CACHE_SIZE = int(os.getenv('VERSION_CACHE_SIZE', '1024'))
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true')
+    METRICS_DIR = os.getenv('METRICS_DIR', os.getenv('PROMETHEUS_MULTIPROC_DIR', ''))
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+    RENDER_CACHE_DIR = os.getenv('RENDER_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'contract_documents'))
+    RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(multiprocessing.cpu_count())))
+    CONTRACT_TEMPLATE_DIR = os.getenv('CONTRACT_TEMPLATE_DIR', os.path.join(os.path.dirname(__file__), 'contract_templates'))
+    TEMPLATE_CACHE_SIZE = int(os.getenv('TEMPLATE_CACHE_SIZE', '32'))
+    BLOB_DIR = os.getenv('BLOB_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'blobs'))
+    BLOB_MAX_AGE = int(os.getenv('BLOB_MAX_AGE', str(365 * 24 * 3600)))
+    IMAGE_THUMB_WIDTH = int(os.getenv('IMAGE_THUMB_WIDTH', '256'))
+    IMAGE_DOCUMENT_WIDTH = int(os.getenv('IMAGE_DOCUMENT_WIDTH', '1400'))
+    IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+    IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', '2'))
+    IMAGE_VARIANT_WAIT = float(os.getenv('IMAGE_VARIANT_WAIT', '5'))
+    CHOICES_TTL = int(os.getenv('CHOICES_TTL', '300'))
+    CHOICES_SEARCH_LIMIT = int(os.getenv('CHOICES_SEARCH_LIMIT', '20'))
+    TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
+    TELEGRAM_AUTH_MAX_AGE = int(os.getenv('TELEGRAM_AUTH_MAX_AGE', '86400'))
+    TELEGRAM_DEFAULT_ROLE = os.getenv('TELEGRAM_DEFAULT_ROLE', 'user')
+    PERMISSION_CACHE_SIZE = int(os.getenv('PERMISSION_CACHE_SIZE', '10000'))
+    PERMISSION_CACHE_TTL = int(os.getenv('PERMISSION_CACHE_TTL', '300'))
+    BOT_WEBHOOK_SECRET = os.getenv('BOT_WEBHOOK_SECRET', '')
+    BOT_QUEUE_SIZE = int(os.getenv('BOT_QUEUE_SIZE', '10000'))
+    BOT_BATCH_SIZE = int(os.getenv('BOT_BATCH_SIZE', '200'))
+    BOT_BATCH_WAIT = float(os.getenv('BOT_BATCH_WAIT', '0.05'))
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true')
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+    RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL', '')
     # Add other configuration variables as needed
\ No newline at end of file
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import zipfile
+from xml.sax.saxutils import escape
+
+from .cache import LRUCache
+from .config import Config
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+_placeholder = re.compile(r"\{\{\s*([\w.]+)\s*\}\}")
+_parts = re.compile(r"word/(document|header\d*|footer\d*)\.xml")
+_line_break = '</w:t><w:br/><w:t xml:space="preserve">'
+
+template_cache = LRUCache(Config.TEMPLATE_CACHE_SIZE)
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+class CompiledTemplate:
+    # members: (ZipInfo, bytes) for parts copied verbatim, or (ZipInfo, fragments)
+    # where fragments alternate static XML and slot names: [xml, slot, xml, ...].
+    def __init__(self, digest, members):
+        self.digest = digest
+        self.members = members
+
+    @property
+    def slots(self):
+        return sorted({slot for _, part in self.members if isinstance(part, list) for slot in part[1::2]})
+
+    def fill(self, values):
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for info, part in self.members:
+                if isinstance(part, list):
+                    chunks = [fragment if index % 2 == 0 else _slot_xml(values.get(fragment)) for index, fragment in enumerate(part)]
+                    part = "".join(chunks).encode("utf-8")
+                archive.writestr(info, part)
+        return output.getvalue()
+
+    def render(self, values, path):
+        with open(path, "wb") as file:
+            file.write(self.fill(values))
+        return path
+
+
+def _slot_xml(value):
+    if value is None:
+        return ""
+    return escape(str(value)).replace("\n", _line_break)
+
+
+def _merge_split_placeholders(root):
+    # Word often splits "{{ name }}" across several runs; join the text of
+    # such paragraphs into their first run so every placeholder sits in one
+    # w:t and stays inline with the surrounding static XML.
+    for paragraph in root.iter(f"{{{W}}}p"):
+        texts = list(paragraph.iter(f"{{{W}}}t"))
+        whole = "".join(text.text or "" for text in texts)
+        if "{{" not in whole:
+            continue
+        if len(_placeholder.findall(whole)) != sum(len(_placeholder.findall(text.text or "")) for text in texts):
+            texts[0].text = whole
+            for text in texts[1:]:
+                text.text = ""
+        for text in texts:
+            if text.text and _placeholder.search(text.text):
+                text.set(XML_SPACE, "preserve")
+
+
+def _compile_part(data):
+    from lxml import etree
+
+    root = etree.fromstring(data)
+    _merge_split_placeholders(root)
+    xml = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True).decode("utf-8")
+    fragments = []
+    position = 0
+    for match in _placeholder.finditer(xml):
+        fragments.extend([xml[position:match.start()], match.group(1)])
+        position = match.end()
+    fragments.append(xml[position:])
+    return fragments
+
+
+def compile_template(data, digest=None):
+    digest = digest or hashlib.sha256(data).hexdigest()
+    members = []
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            part = archive.read(info)
+            members.append((info, _compile_part(part) if _parts.fullmatch(info.filename) else part))
+    return CompiledTemplate(digest, members)
+
+
+def file_digest(path):
+    # Hashing is memoised on (mtime, size) so a warm lookup is one stat call.
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _digests_lock:
+        cached = _digests.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()
+    with _digests_lock:
+        _digests[path] = (key, digest)
+    return digest
+
+
+def load_template(path):
+    digest = file_digest(path)
+    template = template_cache.get(digest)
+    if template is None:
+        with open(path, "rb") as file:
+            template = compile_template(file.read(), digest)
+        template_cache.set(digest, template)
+    return template
+
+
+def template_path(type_name):
+    path = os.path.join(Config.CONTRACT_TEMPLATE_DIR, f"{type_name}.docx")
+    return path if os.path.isfile(path) else None
+
+
+def find_template(type_names):
+    for type_name in type_names:
+        path = template_path(type_name)
+        if path is not None:
+            return path
+    return None
@@ -0,0 +1,41 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from flask import Response
+
+from .config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID, Exception)):
+        return str(value)
+    raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+
+def _orjson_dumps(data):
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, default=_default).encode()
+
+
+encoders = {"stdlib": _stdlib_dumps}
+if orjson is not None:
+    encoders["orjson"] = _orjson_dumps
+
+encoder_name = Config.JSON_ENCODER if Config.JSON_ENCODER in encoders else ("orjson" if orjson is not None else "stdlib")
+dumps = encoders[encoder_name]
+
+
+def json_response(data, status=200, headers=None, mimetype='application/json'):
+    return Response(dumps(data), status=status, headers=headers, mimetype=mimetype)
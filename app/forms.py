@@ -1,3 +1,5 @@
+from operator import attrgetter
+
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField, SelectField, SearchField
 from wtforms.validators import DataRequired, Email, Optional
@@ -5,7 +7,7 @@ from wtforms_alchemy.fields import QuerySelectField
 from wtforms_alchemy import ModelForm
 
 from .models import *
-from .helpers import subject_name
+from .choices import providers
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired()])
@@ -54,8 +56,8 @@ class ContractForm(FlaskForm, ModelForm):
         include_relationships = True
         include_foreign_keys = True
     
-    seller = QuerySelectField("Seller", query_factory=lambda: Seller.query.all(), get_label=lambda s: subject_name(s.subject_id), allow_blank=True, blank_text='Select Seller')
-    client = QuerySelectField("Client", query_factory=lambda: Client.query.all(), get_label=lambda c: subject_name(c.subject_id), allow_blank=True, blank_text='Select Client')
+    seller = QuerySelectField("Seller", query_factory=providers["seller"].choices, get_pk=attrgetter("id"), get_label="label", allow_blank=True, blank_text='Select Seller')
+    client = QuerySelectField("Client", query_factory=providers["client"].choices, get_pk=attrgetter("id"), get_label="label", allow_blank=True, blank_text='Select Client')
 
 
 class PermissionForm(FlaskForm, ModelForm):
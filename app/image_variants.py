@@ -0,0 +1,90 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .blobs import blob_path, is_digest
+from .config import Config
+
+# Widths in pixels; images narrower than the target are re-encoded but never
+# enlarged.
+variants = {
+    "thumb": Config.IMAGE_THUMB_WIDTH,
+    "document": Config.IMAGE_DOCUMENT_WIDTH,
+}
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def variant_path(digest, name):
+    return f"{blob_path(digest)}.{name}"
+
+
+def make_variant(digest, name):
+    # Written next to the original blob; like the blob itself a variant is
+    # derived from the content only, so an existing file is always valid.
+    path = variant_path(digest, name)
+    if os.path.exists(path):
+        return path
+    from PIL import Image, ImageOps
+
+    with Image.open(blob_path(digest)) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((variants[name], variants[name] * 4), Image.Resampling.LANCZOS)
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(partial, "PNG", optimize=True)
+        else:
+            image.convert("RGB").save(partial, "JPEG", quality=Config.IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(partial, path)
+    return path
+
+
+def _executor_instance():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants")
+        return _executor
+
+
+def _finished(key):
+    def callback(future):
+        with _lock:
+            _pending.pop(key, None)
+    return callback
+
+
+def request_variant(digest, name):
+    # Returns a future for the variant file, sharing in-flight work so a burst
+    # of previews for one image resizes it once.
+    key = (digest, name)
+    with _lock:
+        future = _pending.get(key)
+    if future is not None:
+        return future
+    executor = _executor_instance()
+    with _lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        future = _pending[key] = executor.submit(make_variant, digest, name)
+    future.add_done_callback(_finished(key))
+    return future
+
+
+def variant_bytes(digest, name):
+    # Synchronous path for the document renderer, called while a document is
+    # built: in the render pool's worker processes for render-contracts, in
+    # the requesting process for a single document. Falls back to the
+    # original if resizing fails.
+    if not is_digest(digest) or not os.path.exists(blob_path(digest)):
+        return None
+    try:
+        path = make_variant(digest, name)
+    except Exception:
+        path = blob_path(digest)
+    with open(path, "rb") as file:
+        return file.read()
+
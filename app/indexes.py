@@ -0,0 +1,22 @@
+from sqlalchemy import Index
+
+
+def _leading_columns(table):
+    leading = {column.name for column in list(table.primary_key.columns)[:1]}
+    for index in table.indexes:
+        columns = list(index.columns)
+        if columns:
+            leading.add(columns[0].name)
+    return leading
+
+
+def index_foreign_keys(table):
+    # Link tables (<a>_<b>_link with two FK columns) get a unique index on the
+    # pair; every FK column not already leading an index gets its own index.
+    foreign_keys = [column for column in table.columns if column.foreign_keys]
+    if table.name.endswith("_link") and len(foreign_keys) == 2 and not any(index.unique for index in table.indexes):
+        Index(f"ux_{table.name}_pair", *foreign_keys, unique=True)
+    leading = _leading_columns(table)
+    for column in foreign_keys:
+        if column.name not in leading:
+            Index(f"ix_{table.name}_{column.name}", column)
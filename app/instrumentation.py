@@ -0,0 +1,100 @@
+import re
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from .config import Config
+from .encoding import json_response
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|\?|\$\d+")
+_in_lists = re.compile(r"\(\s*(?:\?\s*,\s*)+\?\s*\)")
+_spaces = re.compile(r"\s+")
+
+
+def statement_shape(statement):
+    shape = _literals.sub("?", statement)
+    shape = _in_lists.sub("(?)", shape)
+    return _spaces.sub(" ", shape).strip()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = []
+        self.shapes = {}
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total += elapsed
+        shape = statement_shape(statement)
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+        self.slowest.append((elapsed, statement))
+        self.slowest.sort(key=lambda item: item[0], reverse=True)
+        del self.slowest[Config.SQL_SLOWEST_KEPT:]
+
+    def repeated(self):
+        return {shape: count for shape, count in self.shapes.items() if count >= Config.SQL_REPEAT_THRESHOLD}
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "db_ms": round(self.total * 1000, 3),
+            "slowest": [{"ms": round(elapsed * 1000, 3), "statement": statement} for elapsed, statement in self.slowest],
+            "repeated": [{"count": count, "shape": shape} for shape, count in sorted(self.repeated().items(), key=lambda item: -item[1])],
+        }
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and conn.info.get("query_start"):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = g.get("query_stats")
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+
+def _before_request():
+    g.query_stats = QueryStats()
+    g.request_start = time.perf_counter()
+
+
+def _after_request(response):
+    stats = g.get("query_stats")
+    if stats is None:
+        return response
+    total = (time.perf_counter() - g.request_start) * 1000
+    repeated = stats.repeated()
+    response.headers.add("Server-Timing", f'db;dur={stats.total * 1000:.3f};desc="{stats.count} queries"')
+    response.headers.add("Server-Timing", f"app;dur={total:.3f}")
+    if repeated:
+        response.headers.add("Server-Timing", f'n1;desc="{len(repeated)} repeated statement shapes"')
+        if Config.SQL_LOG_REPEATED:
+            current_app.logger.warning("possible N+1 on %s %s: %s", request.method, request.path, repeated)
+    return response
+
+
+def _debug_dump(response):
+    # Opt-in: ?debug_sql=1 replaces the body with the collected statistics.
+    if Config.SQL_DEBUG_DUMP and request.args.get("debug_sql") == "1" and g.get("query_stats") is not None:
+        data = g.query_stats.to_dict()
+        data["status"] = response.status_code
+        data["path"] = request.path
+        dump = json_response(data)
+        for value in response.headers.getlist("Server-Timing"):
+            dump.headers.add("Server-Timing", value)
+        return dump
+    return response
+
+
+def register_instrumentation(app, engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_debug_dump)
+    app.after_request(_after_request)
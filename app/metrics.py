@@ -0,0 +1,312 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy.pool import QueuePool
+
+from .config import Config
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self.reset()
+
+    def reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(value, other):
+        return other if value is None else value + other
+
+    def format(self, values):
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+    def samples(self):
+        return self.format(self.snapshot())
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = labels
+        self.reset()
+
+    def reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts[0][index] += 1
+            counts[1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self._values.items()}
+
+    @staticmethod
+    def merge(value, other):
+        if value is None:
+            return other
+        return [[a + b for a, b in zip(value[0], other[0])], value[1] + other[1]]
+
+    def samples(self):
+        return self.format(self.snapshot())
+
+    def format(self, values):
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (bound,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help_text = help_text
+        self.read = read
+
+    def reset(self):
+        pass
+
+    def snapshot(self):
+        value = self.read()
+        return {} if value is None else {(): value}
+
+    def format(self, values):
+        # Merged from several processes the labels are (pid,).
+        for labels, value in values.items():
+            yield f"{self.name}{_labels(('pid',), labels)} {value}"
+
+    def samples(self):
+        return self.format(self.snapshot())
+
+
+request_latency = Histogram("http_request_duration_seconds", "Request latency by blueprint and route.", LATENCY_BUCKETS, ("blueprint", "route", "method", "status"))
+response_size = Histogram("http_response_size_bytes", "Response body size by blueprint and route.", SIZE_BUCKETS, ("blueprint", "route"))
+rows_serialized = Histogram("api_rows_serialized", "Model rows serialized per request.", ROW_BUCKETS, ("blueprint", "route"))
+pool_checkout_wait = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", WAIT_BUCKETS)
+schema_reflections = Counter("schema_reflections_total", "Tables reflected by the schema registry.")
+registry = [request_latency, response_size, rows_serialized, pool_checkout_wait, schema_reflections]
+
+
+class TimedQueuePool(QueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def count_serialized(amount=1):
+    if has_request_context():
+        g.rows_serialized = g.get("rows_serialized", 0) + amount
+
+
+# Multi-process mode (METRICS_DIR set, as with several gunicorn workers): each
+# process writes its values to METRICS_DIR/metrics-<pid>.json, periodically
+# and before a scrape, and /metrics merges all files: counters and histograms
+# are summed, gauges are reported per process with a pid label. The master
+# folds the files of exited workers into metrics-dead.json so totals never go
+# backwards.
+_flusher = None
+
+
+def _process_path(pid):
+    return os.path.join(Config.METRICS_DIR, f"metrics-{pid}.json")
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, data):
+    part = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(part, "w") as f:
+        json.dump(data, f)
+    os.replace(part, path)
+
+
+def flush():
+    if not Config.METRICS_DIR:
+        return
+    os.makedirs(Config.METRICS_DIR, exist_ok=True)
+    data = {}
+    for metric in registry:
+        values = metric.snapshot()
+        if values:
+            data[metric.name] = [[list(labels), value] for labels, value in values.items()]
+    _write(_process_path(os.getpid()), data)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(Config.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def start_flusher():
+    global _flusher
+    if not Config.METRICS_DIR or (_flusher is not None and _flusher.is_alive()):
+        return
+    _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+    _flusher.start()
+
+
+def clear_process_files():
+    # Called by the gunicorn master on start: files of a previous run would be
+    # added to this one's totals.
+    if not Config.METRICS_DIR:
+        return
+    os.makedirs(Config.METRICS_DIR, exist_ok=True)
+    for name in os.listdir(Config.METRICS_DIR):
+        if name.startswith("metrics-"):
+            os.remove(os.path.join(Config.METRICS_DIR, name))
+
+
+def mark_process_dead(pid):
+    # Called by the gunicorn master when a worker exits.
+    if not Config.METRICS_DIR:
+        return
+    path = _process_path(pid)
+    data = _read(path)
+    if data is None:
+        return
+    dead_path = _process_path("dead")
+    dead = _read(dead_path) or {}
+    for metric in registry:
+        if metric.kind == "gauge" or metric.name not in data:
+            continue
+        values = {tuple(labels): value for labels, value in dead.get(metric.name, ())}
+        for labels, value in data[metric.name]:
+            values[tuple(labels)] = metric.merge(values.get(tuple(labels)), value)
+        dead[metric.name] = [[list(labels), value] for labels, value in values.items()]
+    _write(dead_path, dead)
+    os.remove(path)
+
+
+def _merged():
+    flush()
+    merged = {metric.name: {} for metric in registry}
+    kinds = {metric.name: metric for metric in registry}
+    for name in sorted(os.listdir(Config.METRICS_DIR)):
+        if not (name.startswith("metrics-") and name.endswith(".json")):
+            continue
+        pid = name[len("metrics-"):-len(".json")]
+        data = _read(os.path.join(Config.METRICS_DIR, name)) or {}
+        for metric_name, samples in data.items():
+            metric = kinds.get(metric_name)
+            if metric is None:
+                continue
+            values = merged[metric_name]
+            for labels, value in samples:
+                if metric.kind == "gauge":
+                    values[(pid,)] = value
+                else:
+                    values[tuple(labels)] = metric.merge(values.get(tuple(labels)), value)
+    return merged
+
+
+def _reset_after_fork():
+    # Values counted before the fork belong to the parent's file.
+    for metric in registry:
+        metric.reset()
+
+
+def render():
+    merged = _merged() if Config.METRICS_DIR else None
+    lines = []
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples() if merged is None else metric.format(merged[metric.name]))
+    return "\n".join(lines) + "\n"
+
+
+def metrics_response():
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.get("metrics_start")
+    if started is None:
+        return response
+    blueprint = request.blueprint or "main"
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    request_latency.observe(time.perf_counter() - started, blueprint, route, request.method, str(response.status_code))
+    if response.content_length is not None:
+        response_size.observe(response.content_length, blueprint, route)
+    if "rows_serialized" in g:
+        rows_serialized.observe(g.rows_serialized, blueprint, route)
+    return response
+
+
+def register_metrics(app, engine):
+    pool = engine.pool
+    registry.extend([
+        Gauge("db_pool_size", "Configured pool size.", lambda: pool.size() if hasattr(pool, "size") else None),
+        Gauge("db_pool_checked_out", "Connections currently checked out.", lambda: pool.checkedout() if hasattr(pool, "checkedout") else None),
+        Gauge("db_pool_overflow", "Connections open beyond pool_size.", lambda: max(pool.overflow(), 0) if hasattr(pool, "overflow") else None),
+    ])
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if Config.METRICS_DIR:
+        os.register_at_fork(before=flush, after_in_child=_reset_after_fork)
+        start_flusher()
@@ -0,0 +1,197 @@
+import click
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+from .blobs import decode_legacy, store_blob
+from .config import Config
+from .versioning import make_delta
+
+
+def sync_id_sequences(models):
+    # Rows used to be inserted with client-side ids (len(table) + 1), which
+    # leaves serial sequences behind max(id); move them forward once.
+    if db.engine.dialect.name != "postgresql":
+        return {}
+    synced = {}
+    with db.engine.begin() as connection:
+        for model_class in models.values():
+            table = model_class.__table__
+            if "id" not in table.c:
+                continue
+            sequence = connection.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table.name}).scalar()
+            if sequence is None:
+                continue
+            synced[table.name] = connection.execute(
+                text(f'SELECT setval(:sequence, GREATEST((SELECT COALESCE(max(id), 0) FROM "{table.name}"), 1))'),
+                {"sequence": sequence},
+            ).scalar()
+    return synced
+
+
+def _duplicate_pairs(connection, index):
+    columns = ", ".join(f'"{column.name}"' for column in index.columns)
+    return connection.execute(text(f'SELECT count(*) FROM (SELECT 1 FROM "{index.table.name}" GROUP BY {columns} HAVING count(*) > 1) AS duplicates')).scalar()
+
+
+def _delete_duplicate_pairs(connection, index):
+    columns = ", ".join(f'"{column.name}"' for column in index.columns)
+    return connection.execute(text(
+        f'DELETE FROM "{index.table.name}" WHERE id NOT IN (SELECT min(id) FROM "{index.table.name}" GROUP BY {columns})'
+    )).rowcount
+
+
+def ensure_indexes(metadata, dedupe=False):
+    # create_all() only creates indexes together with new tables; this adds the
+    # ones declared since to existing databases without blocking writes.
+    report = []
+    existing_tables = set(inspect(db.engine).get_table_names())
+    with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index["name"] for index in inspect(connection).get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                if index.unique and _duplicate_pairs(connection, index):
+                    if not dedupe:
+                        report.append((index.name, "skipped: duplicate rows, rerun with --dedupe"))
+                        continue
+                    report.append((index.name, f"deleted {_delete_duplicate_pairs(connection, index)} duplicate rows"))
+                statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=db.engine.dialect))
+                if db.engine.dialect.name == "postgresql":
+                    statement = statement.replace(" INDEX IF NOT EXISTS ", " INDEX CONCURRENTLY IF NOT EXISTS ", 1)
+                connection.execute(text(statement))
+                report.append((index.name, "created"))
+    return report
+
+
+def migrate_versions(version_classes):
+    # Adds version_counter to versioned tables and the snapshot columns to
+    # their history tables, then starts each counter after its last version.
+    with db.engine.begin() as connection:
+        for model_class, version_class in version_classes.items():
+            table = model_class.__table__.name
+            version_table = version_class.__table__.name
+            connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS version_counter INTEGER NOT NULL DEFAULT 1'))
+            for column in ("name", "number", "content", "delta"):
+                connection.execute(text(f'ALTER TABLE "{version_table}" ADD COLUMN IF NOT EXISTS "{column}" TEXT'))
+            connection.execute(text(f'ALTER TABLE "{version_table}" ADD COLUMN IF NOT EXISTS snapshot BOOLEAN NOT NULL DEFAULT true'))
+            connection.execute(text(
+                f'UPDATE "{table}" AS t SET version_counter = v.last_version + 1 '
+                f'FROM (SELECT original_id, max(version) AS last_version FROM "{version_table}" GROUP BY original_id) AS v '
+                f'WHERE t.id = v.original_id AND t.version_counter <= v.last_version'
+            ))
+
+
+def compact_versions(version_classes, batch_size=500):
+    # Rewrites full-text history rows as deltas, keeping every
+    # VERSION_SNAPSHOT_INTERVAL-th version as a snapshot.
+    interval = max(Config.VERSION_SNAPSHOT_INTERVAL, 1)
+    saved = {}
+    for version_class in version_classes.values():
+        table = version_class.__table__
+        saved[table.name] = 0
+        original_ids = db.session.scalars(select(version_class.original_id).distinct()).all()
+        for start in range(0, len(original_ids), batch_size):
+            rows = db.session.execute(
+                select(table.c.id, table.c.original_id, table.c.version, table.c.content, table.c.snapshot)
+                .where(table.c.original_id.in_(original_ids[start:start + batch_size]))
+                .order_by(table.c.original_id, table.c.version)
+            ).all()
+            updates = []
+            previous = None
+            for row in rows:
+                if previous is None or previous.original_id != row.original_id or previous.version != row.version - 1:
+                    previous = row if row.snapshot else None
+                    continue
+                if row.snapshot and (row.version - 1) % interval != 0:
+                    delta = make_delta(previous.content, row.content)
+                    if len(delta) < len(row.content):
+                        updates.append({"row_id": row.id, "delta": delta})
+                        saved[table.name] += len(row.content) - len(delta)
+                previous = row if row.snapshot else None
+            if updates:
+                db.session.execute(
+                    update(table).where(table.c.id == bindparam("row_id")).values(delta=bindparam("delta"), content=None, snapshot=False),
+                    updates,
+                )
+            db.session.commit()
+    return saved
+
+
+def migrate_images(image_class, batch_size=200):
+    # Moves base64 text in contract_image.byte into the blob store and leaves
+    # the SHA-256 digest in its place. Rows already holding a digest are
+    # skipped, so the command can be rerun after an interruption.
+    table = image_class.__table__
+    moved = 0
+    digests = set()
+    while True:
+        rows = db.session.execute(
+            text(f"SELECT id, byte FROM \"{table.name}\" WHERE byte !~ '^[0-9a-f]{{64}}$' ORDER BY id LIMIT :limit"),
+            {"limit": batch_size},
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            digest = store_blob(decode_legacy(row.byte))
+            digests.add(digest)
+            updates.append({"row_id": row.id, "digest": digest})
+        db.session.execute(update(table).where(table.c.id == bindparam("row_id")).values(byte=bindparam("digest")), updates)
+        db.session.commit()
+        moved += len(updates)
+    return moved, len(digests)
+
+
+def register_commands(app):
+    from app.middleware import model_dict, version_classes
+
+    @app.cli.command("sync-sequences")
+    def sync_sequences_command():
+        for table, value in sync_id_sequences(model_dict).items():
+            click.echo(f"{table}: {value}")
+
+    @app.cli.command("migrate-versions")
+    def migrate_versions_command():
+        migrate_versions(version_classes)
+        click.echo("versioned tables migrated, run ensure-indexes next")
+
+    @app.cli.command("compact-versions")
+    def compact_versions_command():
+        for table, saved in compact_versions(version_classes).items():
+            click.echo(f"{table}: {saved} characters saved")
+
+    @app.cli.command("ensure-indexes")
+    @click.option("--dedupe", is_flag=True, help="Delete duplicate link rows (keeping the lowest id) before adding unique indexes.")
+    def ensure_indexes_command(dedupe):
+        for name, result in ensure_indexes(db.metadata, dedupe=dedupe):
+            click.echo(f"{name}: {result}")
+
+    @app.cli.command("migrate-images")
+    def migrate_images_command():
+        from .models import ContractImage
+
+        moved, unique = migrate_images(ContractImage)
+        click.echo(f"{moved} images moved to {Config.BLOB_DIR} as {unique} unique blobs")
+
+    @app.cli.command("replay-bot-updates")
+    @click.option("--pending-after", type=int, default=600, help="Also replay updates still pending after this many seconds.")
+    def replay_bot_updates_command(pending_after):
+        from .bot import replay_updates
+
+        click.echo(f"{replay_updates(pending_after)} bot updates replayed")
+
+    @app.cli.command("render-contracts")
+    @click.option("--format", "fmt", type=click.Choice(["docx", "pdf"]), default="docx")
+    @click.option("--workers", type=int, default=None, help="Rendering processes, defaults to RENDER_WORKERS.")
+    def render_contracts_command(fmt, workers):
+        from .models import Contract
+        from .rendering import render_contracts
+
+        ids = list(db.session.scalars(select(Contract.id).order_by(Contract.id)))
+        rendered = render_contracts(ids, fmt, workers)
+        click.echo(f"{len(rendered)} contracts rendered to {Config.RENDER_CACHE_DIR}")
+
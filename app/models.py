@@ -1,9 +1,10 @@
 from collections import OrderedDict
 
-from sqlalchemy import func
 from sqlalchemy.inspection import inspect
 
 from app import db
+from .blobs import BlobReference
+from .indexes import index_foreign_keys
 
 class BaseModel:
     def to_dict(self, include_relationships=False, backref_depth=1):
@@ -36,18 +37,21 @@ class VersionModel:
     versions = None
     current_version = None
 
-    def create_version(self, session, version_class):
-        last_version = (session.query(func.max(version_class.version)).filter_by(original_id=self.id).scalar() or 0)
+    # version_counter is the mapper's version_id_col: the ORM bumps it in the
+    # UPDATE itself (WHERE version_counter = old), so the history row number
+    # is known without querying max(version).
+    def version_values(self):
         data = {}
         for column in self.__table__.columns:
-            if column.name not in ['id']:
+            if column.name not in ['id', 'version_counter']:
                 data[column.name] = getattr(self, column.name)
-        new_version = version_class(original=self, current=self, version=last_version + 1, **data)
-        session.add(new_version)
+        data.update(original_id=self.id, current_id=self.id, version=self.version_counter - 1)
+        return data
 
 
 class TelegramID(db.Model, BaseModel):
     __tablename__ = 'telegram_id'
+    __table_args__ = (db.Index('ux_telegram_id_telegram_id', 'telegram_id', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     telegram_id = db.Column(db.Text, nullable=False)
@@ -73,6 +77,7 @@ class Role(db.Model, BaseModel):
 
 class User(db.Model, BaseModel):
     __tablename__ = 'user'
+    __table_args__ = (db.Index('ux_user_telegramid_id', 'telegramid_id', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     telegramid_id = db.Column(db.Integer, db.ForeignKey('telegram_id.id'), nullable=False)
@@ -93,6 +98,19 @@ class Permission(db.Model, BaseModel):
     role = db.relationship('Role', back_populates='permission')
 
 
+class BotUpdate(db.Model, BaseModel):
+    __tablename__ = 'bot_update'
+    __table_args__ = (db.Index('ux_bot_update_update_id', 'update_id', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    update_id = db.Column(db.BigInteger, nullable=True)
+    type = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.Text, nullable=False, default='pending', server_default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    received_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now())
+
+
 class Subject(db.Model, BaseModel):
     __tablename__ = 'subject'
 
@@ -326,6 +344,7 @@ class ContractPoint(db.Model, BaseModel, VersionModel):
     name = db.Column(db.Text, nullable=False)
     number = db.Column(db.Text, nullable=False)
     content = db.Column(db.Text, nullable=False)
+    version_counter = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     contract = db.relationship('ContractContractPointLink', back_populates='contractpoint')
     seller = db.relationship('ContractPointSellerLink', back_populates='contractpoint')
@@ -334,6 +353,8 @@ class ContractPoint(db.Model, BaseModel, VersionModel):
     versions = db.relationship('ContractPointVersion', foreign_keys='ContractPointVersion.original_id', back_populates='original', cascade="all, delete-orphan")
     current_version = db.relationship('ContractPointVersion', foreign_keys='ContractPointVersion.current_id', back_populates='current', uselist=False)
 
+    __mapper_args__ = {"version_id_col": version_counter}
+
 
 class ContractAnnex(db.Model, BaseModel, VersionModel):
     __tablename__ = 'contract_annex'
@@ -342,6 +363,7 @@ class ContractAnnex(db.Model, BaseModel, VersionModel):
     name = db.Column(db.Text, nullable=False)
     number = db.Column(db.Text, nullable=False)
     content = db.Column(db.Text, nullable=False)
+    version_counter = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     contract = db.relationship('ContractContractAnnexLink', back_populates='contractannex')
     seller = db.relationship('ContractAnnexSellerLink', back_populates='contractannex')
@@ -350,6 +372,8 @@ class ContractAnnex(db.Model, BaseModel, VersionModel):
     versions = db.relationship('ContractAnnexVersion', foreign_keys='ContractAnnexVersion.original_id', back_populates='original', cascade="all, delete-orphan")
     current_version = db.relationship('ContractAnnexVersion', foreign_keys='ContractAnnexVersion.current_id', back_populates='current', uselist=False)
 
+    __mapper_args__ = {"version_id_col": version_counter}
+
 
 class ContractImage(db.Model, BaseModel):
     __tablename__ = 'contract_image'
@@ -357,7 +381,7 @@ class ContractImage(db.Model, BaseModel):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.Text, nullable=False)
-    byte = db.Column(db.Text, nullable=False)
+    byte = db.Column(BlobReference, nullable=False)
 
     seller = db.relationship('ContractImageSellerLink', back_populates='contractimage')
     contractpoint = db.relationship('ContractPointContractImageLink', back_populates='contractimage')
@@ -366,6 +390,7 @@ class ContractImage(db.Model, BaseModel):
 
 class Contract(db.Model, BaseModel):
     __tablename__ = 'contract'
+    __table_args__ = (db.Index('ix_contract_date_from_date_to', 'date_from', 'date_to'),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
@@ -382,11 +407,17 @@ class Contract(db.Model, BaseModel):
 
 class ContractPointVersion(db.Model, BaseModel):
     __tablename__ = 'contract_point_version'
+    __table_args__ = (db.Index('ux_contract_point_version_original_version', 'original_id', 'version', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     original_id = db.Column(db.Integer, db.ForeignKey('contract_point.id'), nullable=False)
     current_id = db.Column(db.Integer, db.ForeignKey('contract_point.id'), nullable=False)
     version = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.Text, nullable=True)
+    number = db.Column(db.Text, nullable=True)
+    content = db.Column(db.Text, nullable=True)
+    delta = db.Column(db.Text, nullable=True)
+    snapshot = db.Column(db.Boolean, nullable=False, default=True, server_default=db.text('true'))
 
     original = db.relationship('ContractPoint', foreign_keys=[original_id], back_populates='versions')
     current = db.relationship('ContractPoint', foreign_keys=[current_id], back_populates='current_version')
@@ -394,11 +425,17 @@ class ContractPointVersion(db.Model, BaseModel):
 
 class ContractAnnexVersion(db.Model, BaseModel):
     __tablename__ = 'contract_annex_version'
+    __table_args__ = (db.Index('ux_contract_annex_version_original_version', 'original_id', 'version', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     original_id = db.Column(db.Integer, db.ForeignKey('contract_annex.id'), nullable=False)
     current_id = db.Column(db.Integer, db.ForeignKey('contract_annex.id'), nullable=False)
     version = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.Text, nullable=True)
+    number = db.Column(db.Text, nullable=True)
+    content = db.Column(db.Text, nullable=True)
+    delta = db.Column(db.Text, nullable=True)
+    snapshot = db.Column(db.Boolean, nullable=False, default=True, server_default=db.text('true'))
 
     original = db.relationship('ContractAnnex', foreign_keys=[original_id], back_populates='versions')
     current = db.relationship('ContractAnnex', foreign_keys=[current_id], back_populates='current_version')
@@ -500,3 +537,7 @@ class ContractAnnexContractImageLink(db.Model, BaseModel):
 
     contractannex = db.relationship('ContractAnnex', back_populates='contractimage')
     contractimage = db.relationship('ContractImage', back_populates='contractannex')
+
+
+for _table in db.metadata.tables.values():
+    index_foreign_keys(_table)
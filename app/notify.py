@@ -0,0 +1,86 @@
+import os
+import select
+import threading
+import time
+
+from sqlalchemy import text
+
+
+def notify(engine, channel, message):
+    # Payloads carry the sender pid so listeners can skip their own messages.
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": f"{os.getpid()}:{message}"})
+
+
+class Listener:
+    # on_message(message) runs for notifications on channel from other
+    # processes; on_reconnect() runs after the connection dropped, since
+    # notifications may have been missed meanwhile. All listeners of a process
+    # share one thread and one detached connection (see _Hub).
+    def __init__(self, channel, on_message, on_reconnect):
+        self.channel = channel
+        self.on_message = on_message
+        self.on_reconnect = on_reconnect
+
+    def start(self, engine):
+        if engine.dialect.name != "postgresql":
+            return
+        _hub.add(self, engine)
+
+
+class _Hub:
+    # One LISTEN connection per process, outside the pool, for every channel;
+    # channels added while it runs are picked up within a second.
+    def __init__(self):
+        self.listeners = {}
+        self._engine = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add(self, listener, engine):
+        with self._lock:
+            self.listeners[listener.channel] = listener
+            self._engine = engine
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen, name="notify-listener", daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                self._listen_once()
+            except Exception:
+                for listener in list(self.listeners.values()):
+                    listener.on_reconnect()
+                time.sleep(5)
+
+    def _listen_once(self):
+        connection = self._engine.raw_connection()
+        dbapi_connection = connection.driver_connection
+        connection.detach()
+        try:
+            dbapi_connection.autocommit = True
+            listening = set()
+            pid = str(os.getpid())
+            while True:
+                channels = [channel for channel in list(self.listeners) if channel not in listening]
+                if channels:
+                    with dbapi_connection.cursor() as cursor:
+                        for channel in channels:
+                            cursor.execute(f"LISTEN {channel}")
+                    listening.update(channels)
+                if select.select([dbapi_connection], [], [], 1) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    sender, _, message = notification.payload.partition(":")
+                    listener = self.listeners.get(notification.channel)
+                    if sender != pid and listener is not None:
+                        listener.on_message(message)
+        finally:
+            dbapi_connection.close()
+
+
+_hub = _Hub()
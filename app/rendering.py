@@ -0,0 +1,306 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy.orm import load_only, selectinload
+
+from app import db
+from .blobs import decode_legacy, is_digest
+from .config import Config
+from .image_variants import variant_bytes
+from .docx_templates import file_digest, find_template, load_template
+from .models import (
+    Client, Contract, ContractAnnex, ContractAnnexContractImageLink, ContractContractAnnexLink,
+    ContractContractPointLink, ContractContractTypeLink, ContractImage, ContractPoint,
+    ContractPointContractImageLink, Seller, Subject,
+)
+
+# Bump when the document layout changes so cached files are not reused.
+RENDERER_VERSION = 2
+
+formats = ("docx", "pdf")
+
+
+def _contract_query(full):
+    # The fingerprint pass only needs ids and version counters of the linked
+    # documents; the full pass also loads their content and image bytes.
+    point_images = selectinload(ContractPoint.contractimage).selectinload(ContractPointContractImageLink.contractimage)
+    annex_images = selectinload(ContractAnnex.contractimage).selectinload(ContractAnnexContractImageLink.contractimage)
+    point_options = [point_images]
+    annex_options = [annex_images]
+    if not full:
+        image_columns = (ContractImage.id, ContractImage.name, ContractImage.byte)
+        point_options = [load_only(ContractPoint.id, ContractPoint.number, ContractPoint.version_counter), point_images.load_only(*image_columns)]
+        annex_options = [load_only(ContractAnnex.id, ContractAnnex.number, ContractAnnex.version_counter), annex_images.load_only(*image_columns)]
+    return db.session.query(Contract).options(
+        selectinload(Contract.seller).selectinload(Seller.subject).selectinload(Subject.person),
+        selectinload(Contract.seller).selectinload(Seller.subject).selectinload(Subject.company),
+        selectinload(Contract.client).selectinload(Client.subject).selectinload(Subject.person),
+        selectinload(Contract.client).selectinload(Client.subject).selectinload(Subject.company),
+        selectinload(Contract.contracttype).selectinload(ContractContractTypeLink.contracttype),
+        selectinload(Contract.contractpoint).selectinload(ContractContractPointLink.contractpoint).options(*point_options),
+        selectinload(Contract.contractannex).selectinload(ContractContractAnnexLink.contractannex).options(*annex_options),
+    )
+
+
+def _subject_details(subject):
+    if subject is None:
+        return {"name": "", "details": []}
+    if subject.company:
+        company = subject.company[0]
+        details = [("STIR", company.stir), ("Address", company.address), ("Director", company.director),
+                   ("Bank", company.bank_name), ("Account", company.bank_account), ("MFO", company.bank_mfo),
+                   ("OKED", company.bank_oked), ("Phone", company.phone), ("Email", company.email)]
+        return {"name": company.legacy_name, "details": [(label, value) for label, value in details if value]}
+    if subject.person:
+        person = subject.person[0]
+        details = [("Passport", person.passport_id), ("Given", person.passport_given), ("Personal ID", person.personal_id),
+                   ("Date of birth", person.date_of_birth.isoformat() if person.date_of_birth else None), ("Address", person.address)]
+        return {"name": person.name, "details": [(label, value) for label, value in details if value]}
+    return {"name": subject.name, "details": []}
+
+
+def _sorted_documents(links, key):
+    documents = [getattr(link, key) for link in links if getattr(link, key) is not None]
+    # Numbers are stored as text, so "10" would otherwise sort before "2".
+    return sorted(documents, key=lambda document: (not document.number.isdigit(), int(document.number) if document.number.isdigit() else 0, document.number, document.id))
+
+
+def _image_refs(document):
+    return [link.contractimage for link in document.contractimage if link.contractimage is not None]
+
+
+def _type_names(contract):
+    return sorted(link.contracttype.name for link in contract.contracttype if link.contracttype is not None)
+
+
+def _template_digest(contract):
+    path = find_template(_type_names(contract))
+    return file_digest(path) if path is not None else None
+
+
+def fingerprint(contract):
+    # Only ids, version counters and the small party/contract fields are
+    # read, so an unchanged contract is recognised without loading content.
+    data = {
+        "renderer": RENDERER_VERSION,
+        "template": _template_digest(contract),
+        "contract": [contract.id, contract.date_from.isoformat(), contract.date_to.isoformat()],
+        "seller": _subject_details(contract.seller.subject if contract.seller else None),
+        "client": _subject_details(contract.client.subject if contract.client else None),
+        "types": _type_names(contract),
+        "points": [[point.id, point.version_counter, [[image.id, image.name, image.byte] for image in _image_refs(point)]]
+                   for point in _sorted_documents(contract.contractpoint, "contractpoint")],
+        "annexes": [[annex.id, annex.version_counter, [[image.id, image.name, image.byte] for image in _image_refs(annex)]]
+                    for annex in _sorted_documents(contract.contractannex, "contractannex")],
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def image_ref(image):
+    # Stored blobs travel as their digest and are resized by whichever process
+    # builds the document (the pool workers for render-contracts); legacy
+    # inline images are decoded here.
+    if is_digest(image.byte):
+        return {"name": image.name, "digest": image.byte}
+    return {"name": image.name, "data": decode_legacy(image.byte or "")}
+
+
+def image_bytes(image):
+    # Documents embed the document-width variant rather than the original.
+    if "digest" in image:
+        return variant_bytes(image["digest"], "document")
+    return image["data"]
+
+
+def _document_context(document):
+    return {
+        "id": document.id,
+        "number": document.number,
+        "name": document.name,
+        "content": document.content,
+        "images": [image_ref(image) for image in _image_refs(document)],
+    }
+
+
+def contract_context(contract):
+    return {
+        "id": contract.id,
+        "date_from": contract.date_from.isoformat(),
+        "date_to": contract.date_to.isoformat(),
+        "seller": _subject_details(contract.seller.subject if contract.seller else None),
+        "client": _subject_details(contract.client.subject if contract.client else None),
+        "types": _type_names(contract),
+        "points": [_document_context(point) for point in _sorted_documents(contract.contractpoint, "contractpoint")],
+        "annexes": [_document_context(annex) for annex in _sorted_documents(contract.contractannex, "contractannex")],
+    }
+
+
+def _add_images(document, images):
+    from docx.shared import Inches
+
+    for image in images:
+        data = image_bytes(image)
+        if not data:
+            continue
+        try:
+            document.add_picture(io.BytesIO(data), width=Inches(5.5))
+        except Exception:
+            document.add_paragraph(f"[{image['name']}]")
+
+
+def _add_party(document, title, party):
+    document.add_heading(f"{title}: {party['name']}", level=2)
+    if party["details"]:
+        table = document.add_table(rows=0, cols=2)
+        for label, value in party["details"]:
+            cells = table.add_row().cells
+            cells[0].text = label
+            cells[1].text = str(value)
+
+
+def _party_text(party):
+    return "\n".join(f"{label}: {value}" for label, value in party["details"])
+
+
+def _documents_text(documents):
+    return "\n\n".join(f"{document['number']}. {document['name']}\n{document['content']}" for document in documents)
+
+
+def template_values(context):
+    # Flat slot values for compiled templates, e.g. {{ seller.name }}.
+    values = {
+        "contract.id": context["id"],
+        "contract.date_from": context["date_from"],
+        "contract.date_to": context["date_to"],
+        "contract.types": ", ".join(context["types"]),
+        "points": _documents_text(context["points"]),
+        "annexes": _documents_text(context["annexes"]),
+    }
+    for role in ("seller", "client"):
+        values[f"{role}.name"] = context[role]["name"]
+        values[f"{role}.details"] = _party_text(context[role])
+        for label, value in context[role]["details"]:
+            values[f"{role}.{label.lower().replace(' ', '_')}"] = value
+    return values
+
+
+def render_docx(context, path):
+    # Contract types with a template in CONTRACT_TEMPLATE_DIR fill its
+    # compiled slots; the rest are laid out with python-docx.
+    template = find_template(context["types"])
+    if template is not None:
+        return load_template(template).render(template_values(context), path)
+
+    from docx import Document
+
+    document = Document()
+    title = f"Contract No. {context['id']}"
+    if context["types"]:
+        title += f" ({', '.join(context['types'])})"
+    document.add_heading(title, 0)
+    document.add_paragraph(f"Valid from {context['date_from']} to {context['date_to']}")
+    _add_party(document, "Seller", context["seller"])
+    _add_party(document, "Client", context["client"])
+    for point in context["points"]:
+        document.add_heading(f"{point['number']}. {point['name']}", level=1)
+        for paragraph in point["content"].split("\n"):
+            document.add_paragraph(paragraph)
+        _add_images(document, point["images"])
+    for annex in context["annexes"]:
+        document.add_page_break()
+        document.add_heading(f"Annex {annex['number']}. {annex['name']}", level=1)
+        for paragraph in annex["content"].split("\n"):
+            document.add_paragraph(paragraph)
+        _add_images(document, annex["images"])
+    document.save(path)
+    return path
+
+
+def _convert_to_pdf(docx_path, pdf_path):
+    if sys.platform in ("win32", "darwin"):
+        from docx2pdf import convert
+
+        convert(docx_path, pdf_path)
+        return pdf_path
+    office = shutil.which("soffice") or shutil.which("libreoffice")
+    if office is None:
+        raise RuntimeError("PDF rendering needs Microsoft Word (docx2pdf) or LibreOffice")
+    with tempfile.TemporaryDirectory() as outdir:
+        subprocess.run([office, "--headless", "--convert-to", "pdf", "--outdir", outdir, docx_path], check=True, capture_output=True, timeout=120)
+        produced = os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + ".pdf")
+        os.replace(produced, pdf_path)
+    return pdf_path
+
+
+def cache_path(digest, fmt):
+    return os.path.join(Config.RENDER_CACHE_DIR, digest[:2], f"{digest}.{fmt}")
+
+
+def render_to_cache(context, digest, fmt):
+    # Writes under a temporary name first so readers never see a partial file.
+    docx_path = cache_path(digest, "docx")
+    os.makedirs(os.path.dirname(docx_path), exist_ok=True)
+    if not os.path.exists(docx_path):
+        partial = f"{docx_path}.{os.getpid()}.{threading.get_ident()}.part"
+        render_docx(context, partial)
+        os.replace(partial, docx_path)
+    if fmt == "docx":
+        return docx_path
+    pdf_path = cache_path(digest, "pdf")
+    if not os.path.exists(pdf_path):
+        partial = f"{pdf_path}.{os.getpid()}.{threading.get_ident()}.part.pdf"
+        _convert_to_pdf(docx_path, partial)
+        os.replace(partial, pdf_path)
+    return pdf_path
+
+
+def render_contract(contract_id, fmt="docx"):
+    contract = _contract_query(full=False).filter(Contract.id == contract_id).one_or_none()
+    if contract is None:
+        return None, None
+    digest = fingerprint(contract)
+    path = cache_path(digest, fmt)
+    if os.path.exists(path):
+        return path, digest
+    contract = _contract_query(full=True).populate_existing().filter(Contract.id == contract_id).one()
+    return render_to_cache(contract_context(contract), digest, fmt), digest
+
+
+def _render_job(job):
+    context, digest, fmt = job
+    return context["id"], render_to_cache(context, digest, fmt)
+
+
+def render_contracts(contract_ids, fmt="docx", workers=None, chunk_size=100):
+    # Database work stays in this process; only the document building, which
+    # is CPU bound, is spread over the process pool.
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers or Config.RENDER_WORKERS) as executor:
+        for start in range(0, len(contract_ids), chunk_size):
+            chunk = contract_ids[start:start + chunk_size]
+            jobs = []
+            missing = []
+            for contract in _contract_query(full=False).filter(Contract.id.in_(chunk)):
+                digest = fingerprint(contract)
+                path = cache_path(digest, fmt)
+                if os.path.exists(path):
+                    results[contract.id] = path
+                else:
+                    missing.append((contract.id, digest))
+            db.session.expunge_all()
+            if missing:
+                digests = dict(missing)
+                for contract in _contract_query(full=True).filter(Contract.id.in_(list(digests))):
+                    jobs.append((contract_context(contract), digests[contract.id], fmt))
+                db.session.expunge_all()
+            for contract_id, path in executor.map(_render_job, jobs):
+                results[contract_id] = path
+    return results
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import secrets
+import threading
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, request
+from sqlalchemy import inspect
+
+from app import db
+from .cache import LRUCache, invalidate_on_commit
+from .config import Config
+from .metrics import Counter, registry
+from .notify import Listener, notify
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+response_cache_requests = Counter("response_cache_requests_total", "Cacheable GET requests by outcome.", ("result",))
+registry.append(response_cache_requests)
+
+# Headers produced by the list/detail views that belong to the cached body.
+_kept_headers = ("X-Next-Cursor", "Link")
+
+
+class LocalBackend:
+    # Every table has a generation number that is bumped when a commit writes
+    # to it. Cache keys include the generations of all tables a response was
+    # built from, so invalidation never has to find and delete entries.
+    # Generations restart at zero in every process, so the epoch starts at a
+    # random value per process (re-drawn after fork, as the app is preloaded
+    # in the gunicorn master); otherwise a restarted or recycled worker would
+    # hand out an earlier ETag for data that has changed since.
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.bodies = LRUCache(self.maxsize)
+        self.epoch = secrets.randbits(64)
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generations(self, tables):
+        with self._lock:
+            return (self.epoch,) + tuple(self._generations.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            self.epoch += 1
+
+    def get(self, key):
+        return self.bodies.get(key)
+
+    def set(self, key, value):
+        self.bodies.set(key, value)
+
+
+class RedisBackend(LocalBackend):
+    # Generations and bodies live in Redis so all workers and hosts share
+    # them; bodies are also kept in the local LRU, which is safe because a key
+    # never changes meaning.
+    prefix = "response-cache:"
+
+    def __init__(self, maxsize, url, ttl):
+        super().__init__(maxsize)
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def generations(self, tables):
+        keys = [f"{self.prefix}generation:{table}" for table in ("*",) + tuple(tables)]
+        values = self.client.mget(keys)
+        if values[0] is None:
+            # A fresh (or flushed) Redis: start the shared epoch at a random
+            # value so ETags from before cannot come back.
+            self.client.set(keys[0], secrets.randbits(63), nx=True)
+            values = self.client.mget(keys)
+        return tuple(int(value or 0) for value in values)
+
+    def bump(self, tables):
+        pipeline = self.client.pipeline(transaction=False)
+        for table in tables:
+            pipeline.incr(f"{self.prefix}generation:{table}")
+        pipeline.execute()
+
+    def bump_all(self):
+        self.client.incr(f"{self.prefix}generation:*")
+
+    def get(self, key):
+        value = super().get(key)
+        if value is None:
+            stored = self.client.get(f"{self.prefix}body:{key}")
+            if stored is not None:
+                headers, _, body = stored.partition(b"\n")
+                value = (json.loads(headers), body)
+                super().set(key, value)
+        return value
+
+    def set(self, key, value):
+        super().set(key, value)
+        headers, body = value
+        self.client.setex(f"{self.prefix}body:{key}", self.ttl, json.dumps(headers).encode() + b"\n" + body)
+
+
+def _make_backend():
+    if Config.RESPONSE_CACHE_REDIS_URL and redis is not None:
+        return RedisBackend(Config.RESPONSE_CACHE_SIZE, Config.RESPONSE_CACHE_REDIS_URL, Config.RESPONSE_CACHE_TTL)
+    return LocalBackend(Config.RESPONSE_CACHE_SIZE)
+
+
+backend = _make_backend()
+_dependencies = {}
+
+
+def dependencies(model_class, depth):
+    # Tables a response at this depth is built from: the model's own table
+    # plus every table reached through relationships within depth hops. Link
+    # tables are part of that walk, so adding or removing a link invalidates
+    # the responses on both sides of it.
+    key = (model_class, depth)
+    tables = _dependencies.get(key)
+    if tables is None:
+        seen = {model_class.__table__.name}
+        frontier = [inspect(model_class)]
+        for _ in range(depth):
+            next_frontier = []
+            for mapper in frontier:
+                for rel in mapper.relationships:
+                    if rel.mapper.local_table.name not in seen:
+                        seen.add(rel.mapper.local_table.name)
+                        next_frontier.append(rel.mapper)
+            frontier = next_frontier
+        tables = _dependencies[key] = tuple(sorted(seen))
+    return tables
+
+
+def forget_model(model_class):
+    for key in [k for k in _dependencies if k[0] is model_class]:
+        _dependencies.pop(key, None)
+
+
+def cached_response(f):
+    # GET responses of model views are cached per path, query string and the
+    # generations of the tables they depend on. The ETag is derived from the
+    # same key, so If-None-Match is answered before any query runs.
+    from .middleware import model_dict, schema_registry
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        model_class = model_dict.get(kwargs.get("model"))
+        if (not Config.RESPONSE_CACHE_ENABLED or request.method != "GET" or model_class is None
+                or "stream" in request.args or "debug_sql" in request.args):
+            return f(*args, **kwargs)
+        depth = max(0, min(request.args.get("depth", 1, type=int), Config.API_MAX_DEPTH))
+        tables = dependencies(model_class, depth)
+        query = urlencode(sorted(request.args.items(multi=True)))
+        key = hashlib.sha256(f"{schema_registry.generation}|{request.path}?{query}|{tables}|{backend.generations(tables)}".encode()).hexdigest()
+        etag = key[:32]
+        if request.if_none_match.contains(etag):
+            response_cache_requests.inc("not_modified")
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        cached = backend.get(key)
+        if cached is not None:
+            response_cache_requests.inc("hit")
+            headers, body = cached
+            response = Response(body, headers=headers, mimetype='application/json')
+        else:
+            response_cache_requests.inc("miss")
+            response = f(*args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200 or response.is_streamed:
+                return response
+            backend.set(key, ({name: response.headers[name] for name in _kept_headers if name in response.headers}, response.get_data()))
+        response.set_etag(etag)
+        return response
+    return decorated_function
+
+
+def _invalidate(tables):
+    backend.bump(tables)
+    if not isinstance(backend, RedisBackend) and db.engine.dialect.name == "postgresql":
+        notify(db.engine, _listener.channel, ",".join(sorted(tables)))
+
+
+_listener = Listener("response_cache", lambda message: backend.bump(message.split(",")), backend.bump_all)
+
+
+def start_listener():
+    # Only the in-process backend needs to hear about other workers' writes.
+    if not isinstance(backend, RedisBackend):
+        _listener.start(db.engine)
+
+
+def register_response_cache_events():
+    invalidate_on_commit(db.session, None, _invalidate)
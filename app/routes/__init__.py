@@ -1,5 +1,7 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, abort, render_template
 
+from ..config import Config
+from ..metrics import metrics_response
 from .admin import admin_bp
 from .api import api_bp
 from .user import user_bp
@@ -10,6 +12,12 @@ bp = Blueprint('main', __name__)
 def main_index():
     return render_template("index.html")
 
+@bp.route("/metrics")
+def main_metrics():
+    if not Config.METRICS_ENABLED:
+        abort(404)
+    return metrics_response()
+
 def register_blueprints(app):
   app.register_blueprint(bp, url_prefix='/')
   app.register_blueprint(admin_bp, url_prefix='/admin')
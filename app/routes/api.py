@@ -1,68 +1,206 @@
+import datetime
+import hmac
 import json
-from urllib.parse import parse_qs, unquote_plus, urlparse
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from urllib.parse import urlencode
 
 
 import inflection
-from sqlalchemy import inspect
-from flask import Blueprint, Response, jsonify, request
+from sqlalchemy import inspect, func, insert, literal, select, text, union_all
+from flask import Blueprint, Response, g, jsonify, redirect, request, send_file, stream_with_context
 from sqlalchemy.orm import selectinload, joinedload, subqueryload
-from sqlalchemy.ext.declarative import declarative_base
 from app import db
 
+from ..batch import apply_batch
+from ..choices import providers
+from ..bot import update_queue, validate_update
+from ..blobs import blob_path, content_type, is_digest
+from ..image_variants import request_variant, variant_path, variants
+from ..config import Config
 from ..models import *
-from ..middleware import params_valid, model_dict, load_tables
+from ..middleware import params_valid, model_dict, load_tables, schema_registry, version_classes
+from ..encoding import dumps, json_response
+from ..indexes import index_foreign_keys
+from ..rendering import formats, render_contract
+from ..response_cache import cached_response
+from ..serializers import serializer_plan
+from ..validation import column_type_dict
+from ..versioning import reconstruct
 
 api_bp = Blueprint('api', __name__)
 
-_metadata = db.MetaData()
+_summary_cache = {}
 
-column_type_dict = {
-    "int": db.Integer,
-    "text": db.Text,
-    "timestamp": db.TIMESTAMP,
-    "datetime": db.DateTime,
-    "date": db.Date
-}
+def _bulk_create(model_class, rows):
+    if not rows:
+        return json_response({"status": 200, "ids": [], "count": 0}), 200
+    try:
+        ids = db.session.scalars(insert(model_class).returning(model_class.id, sort_by_parameter_order=True), rows).all()
+        db.session.commit()
+    except Exception as err:
+        db.session.rollback()
+        return json_response({"status": 500, "error": err}), 500
+    return json_response({"status": 200, "ids": ids, "count": len(ids)}), 200
 
-def _get_model_attributes(model):
-    mapper = inspect(model).mapper
-    return [prop.key for prop in mapper.attrs]
+def _split_param(name):
+    if name not in request.args:
+        return None
+    return [item for value in request.args.getlist(name) for item in value.split(",") if item]
 
-def _with_all_rels(model):
-    return [selectinload(getattr(model, rel.key)) for rel in model.__mapper__.relationships]
+def _depth_param():
+    depth = request.args.get("depth", 1, type=int)
+    return max(0, min(depth, Config.API_MAX_DEPTH))
 
-def _model_to_dict(obj, seen=None):
-    if obj is None:
-        return None
-    if seen is None:
-        seen = set()
-    if id(obj) in seen:
-        return None
-    seen.add(id(obj))
-    result = {}
-    mapper = inspect(obj).mapper
-    for c in mapper.column_attrs:
-        value = getattr(obj, c.key)
-        if isinstance(value, (int, float, str, bool)) or value is None:
-            result[c.key] = value
-        else:
-            result[c.key] = str(value)
-    for r in mapper.relationships:
-        value = getattr(obj, r.key)
-        if value is None:
-            result[r.key] = None
-        elif r.uselist:
-            result[r.key] = [_model_to_dict(child, seen) for child in value]
-        else:
-            result[r.key] = _model_to_dict(value, seen)
-    return result
+def _page_query(model_class, stream=False):
+    mapper = inspect(model_class)
+    limit = request.args.get("limit", None if stream else Config.API_PAGE_LIMIT, type=int)
+    if limit is not None:
+        limit = max(1, limit if stream else min(limit, Config.API_MAX_PAGE_LIMIT))
+    after = request.args.get("after", None, type=int)
+    fields = _split_param("fields")
+    expand = _split_param("expand")
+    if fields is not None:
+        wrong = [x for x in fields if x not in mapper.column_attrs]
+        if wrong:
+            return None, {"status": 403, "keys": ["fields"], "wrong_value": wrong, "reason": "unknown column"}
+        fields = ["id"] + [x for x in fields if x != "id"]
+    if expand is not None:
+        wrong = [x for x in expand if x not in mapper.relationships]
+        if wrong:
+            return None, {"status": 403, "keys": ["expand"], "wrong_value": wrong, "reason": "unknown relationship"}
+    plan = serializer_plan(model_class, _depth_param(), fields, expand)
+    query = db.session.query(model_class).options(*plan.loader_options())
+    if after is not None:
+        query = query.filter(model_class.id > after)
+    query = query.order_by(model_class.id)
+    if stream:
+        query = query.yield_per(Config.API_STREAM_BATCH)
+        if limit is not None:
+            query = query.limit(limit)
+    else:
+        query = query.limit(limit + 1)
+    return (query, limit, plan), None
+
+def _filter_value(column, value):
+    python_type = column.type.python_type
+    if python_type is str:
+        return column.ilike(f"%{value}%")
+    if python_type is bool:
+        return column.is_(value.lower() in ("1", "true"))
+    if python_type in (datetime.date, datetime.datetime):
+        return column == python_type.fromisoformat(value)
+    return column == python_type(value)
+
+def _table_query(model_class):
+    # Offset pages over a sorted, filtered query; a table view needs the total
+    # and random access to pages rather than a forward-only cursor.
+    mapper = inspect(model_class)
+    columns = {prop.key: prop.columns[0] for prop in mapper.column_attrs}
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = max(1, min(request.args.get("per_page", Config.API_PAGE_LIMIT, type=int), Config.API_MAX_PAGE_LIMIT))
+    sort = request.args.get("sort", "id")
+    key = sort.lstrip("-")
+    if key not in columns:
+        return None, {"status": 403, "keys": ["sort"], "wrong_value": sort, "reason": "unknown column"}
+    order = getattr(model_class, key).desc() if sort.startswith("-") else getattr(model_class, key).asc()
+    conditions = []
+    for name, value in request.args.items():
+        if not name.startswith("filter.") or value == "":
+            continue
+        column = name[len("filter."):]
+        if column not in columns:
+            return None, {"status": 403, "keys": [name], "reason": "unknown column"}
+        try:
+            conditions.append(_filter_value(getattr(model_class, column), value))
+        except (ValueError, NotImplementedError):
+            return None, {"status": 403, "keys": [name], "wrong_value": value, "reason": "value does not match the column type"}
+    total = db.session.scalar(select(func.count()).select_from(model_class).where(*conditions))
+    plan = serializer_plan(model_class, 0)
+    query = db.session.query(model_class).filter(*conditions).order_by(order, model_class.id).offset((page - 1) * per_page).limit(per_page)
+    return (query, plan, total, page, per_page), None
+
+def _column_summary(column):
+    return {
+        "name": column.name,
+        "type": str(column.type),
+        "nullable": column.nullable,
+        "primary_key": column.primary_key,
+        "ref": [str(fk.target_fullname) for fk in column.foreign_keys],
+    }
+
+def _count_rows(tables):
+    if not tables:
+        return {}
+    statement = union_all(*[select(literal(name).label("model"), func.count().label("count")).select_from(table) for name, table in tables.items()])
+    return {row.model: row.count for row in db.session.execute(statement)}
+
+def _estimate_rows(tables):
+    names = {table.name: model for model, table in tables.items()}
+    rows = db.session.execute(text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relname = ANY(:names)"), {"names": list(names)})
+    counts = {names[row.relname]: int(row.reltuples) for row in rows if row.reltuples >= 0}
+    counts.update(_count_rows({model: table for model, table in tables.items() if model not in counts}))
+    return counts
+
+def _models_summary(estimate=False):
+    estimate = estimate and db.engine.dialect.name == "postgresql"
+    key = (schema_registry.generation, estimate)
+    cached = _summary_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    tables = {model: model_class.__table__ for model, model_class in list(model_dict.items())}
+    counts = _estimate_rows(tables) if estimate else _count_rows(tables)
+    summary = {
+        model: {"count": counts.get(model, 0), "estimate": estimate, "columns": [_column_summary(c) for c in table.columns]}
+        for model, table in tables.items()
+    }
+    _summary_cache.clear()
+    _summary_cache[key] = (time.monotonic() + Config.API_SUMMARY_TTL, summary)
+    return summary
+
+def _stream_mode():
+    mode = request.args.get("stream", None)
+    if mode not in (None, "json", "ndjson"):
+        return None, {"status": 403, "keys": ["stream"], "wrong_value": mode, "reason": "stream should be json or ndjson"}
+    return mode, None
+
+def _stream_response(sections, mode, named=False):
+    # sections yields (model, rows, serialize); named wraps each section as {model: [rows]}
+    def generate():
+        if mode == "json" and named:
+            yield b"["
+        for index, (model, rows, serialize) in enumerate(sections):
+            if mode == "json":
+                yield ((b"," if index else b"") + b"{" + dumps(model) + b":[") if named else b"["
+            batch = []
+            first = True
+            for row in rows:
+                if mode == "ndjson":
+                    item = {"model": model, "data": serialize(row)} if named else serialize(row)
+                    batch.append(dumps(item) + b"\n")
+                else:
+                    batch.append(dumps(serialize(row)) if first else b"," + dumps(serialize(row)))
+                    first = False
+                if len(batch) >= Config.API_STREAM_BATCH:
+                    yield b"".join(batch)
+                    batch = []
+            if batch:
+                yield b"".join(batch)
+            if mode == "json":
+                yield b"]}" if named else b"]"
+        if mode == "json" and named:
+            yield b"]"
+    mimetype = 'application/x-ndjson' if mode == "ndjson" else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
 
-def _register_dynamic_model(table_name):
-    table = db.Table(inflection.underscore(table_name).lower(), _metadata, autoload_with=db.engine)
-    class DynamicModel(declarative_base()):
-        __table__ = table
-    model_dict[inflection.underscore(table_name).lower().replace("_", "")] = DynamicModel
-    return DynamicModel
+def _next_page_headers(last_id):
+    args = request.args.to_dict(flat=False)
+    args["after"] = [str(last_id)]
+    return {
+        "X-Next-Cursor": str(last_id),
+        "Link": f'<{request.base_url}?{urlencode(args, doseq=True)}>; rel="next"',
+    }
 
 @api_bp.route('/', methods=['GET'])
 @params_valid
@@ -72,25 +210,64 @@ def api_index():
         "request_params": [
             {
                 f"GET": {
-                    "paths": ["/api/models", "/api/model/<string:model>", "/api/model/<string:model>/<int:id>"],
-                    "params": False,
+                    "paths": ["/api/models", "/api/model/<string:model>", "/api/model/<string:model>/table", "/api/model/<string:model>/<int:id>", "/api/model/<string:model>/<int:id>/versions", "/api/model/<string:model>/<int:id>/versions/<int:number>", "/api/contract/<int:id>/document", "/api/image/<string:sha256>", "/api/image/<string:sha256>/<string:variant>", "/api/choices/<string:role>"],
+                    "params": {
+                        "/api/image/<string:sha256>/<string:variant>": {
+                            "variant": list(variants)
+                        },
+                        "/api/choices/<string:role>": {
+                            "role": list(providers),
+                            "q": ["str"],
+                            "limit": ["int"]
+                        },
+                        "/api/contract/<int:id>/document": {
+                            "format": ["docx", "pdf"]
+                        },
+                        "/api/models": {
+                            "summary": ["1"],
+                            "estimate": ["1"],
+                            "stream": ["json", "ndjson"]
+                        },
+                        "/api/model/<string:model>": {
+                            "stream": ["json", "ndjson"],
+                            "limit": ["int"],
+                            "after": ["int"],
+                            "fields": ["<column>,<column>"],
+                            "expand": ["<relationship>,<relationship>"],
+                            "depth": ["int"]
+                        },
+                        "/api/model/<string:model>/table": {
+                            "page": ["int"],
+                            "per_page": ["int"],
+                            "sort": ["<column>", "-<column>"],
+                            "filter.<column>": ["value"]
+                        },
+                        "/api/model/<string:model>/<int:id>": {
+                            "depth": ["int"]
+                        }
+                    },
                     "fragment": False
                 }
             }, 
             {
                 f"POST": {
-                    "paths": ["/api/models", "/api/model/<string:model>"],
+                    "paths": ["/api/models", "/api/model/<string:model>", "/api/model/<string:model>/batch"],
                     "params": {
                         "format": ["params", "json"],
+                        "/api/model/<string:model>/batch": {
+                            "on": ["<column>,<column> (upsert conflict target, default id)"],
+                            "body": ["[{\"op\": \"create|update|upsert|delete\", \"id\": int, \"values\": {<column>: <value>}}, ...] as JSON or NDJSON"]
+                        },
                         "/api/models": {
                             "table": ["string"],
                             "column": ["string"],
-                            "column_type": ["string"],
+                            "column_type": list(column_type_dict),
                             "ref": ["<table>.<column_name>"],
                         },
                         "/api/model/<string:model>": {
                             "column": ["string"],
-                            "value": ["string", "int"]
+                            "value": ["string", "int"],
+                            "rows": ["[{<column>: <value>}, ...] (format=json, bulk create)"]
                         }
                     },
                     "fragment": False
@@ -133,7 +310,12 @@ def api_index():
             "attention": "In [feature] you should not use <column_type>, <value>, <ref> for prevent get error from server."
         },
         "usage": {
-            "GET": "/api/...",
+            "GET": [
+                "/api/...",
+                "/api/models?summary=1&estimate=1",
+                "/api/model/<string:model>?limit=50&after=100&fields=name,number&expand=seller",
+                "/api/model/<string:model>?stream=ndjson"
+            ],
             "POST": [
                 {
                     f"/api/models": [
@@ -147,7 +329,8 @@ def api_index():
                     "/api/model/<string:model>": [
                         "?format=params&column=Name&column=Username&value=Jonh&value=jonhdoe",
                         "?format=params&column=Name.Jonh&column=Username.jonhdoe",
-                        "?format=json"
+                        "?format=json",
+                        "?format=json {\"rows\": [{\"name\": \"Jonh\"}, {\"name\": \"Joe\"}]}"
                     ]
                 }
             ],
@@ -171,7 +354,7 @@ def api_index():
             ]
         }
     }
-    return Response(json.dumps(response), mimetype='application/json')
+    return json_response(response)
 
 @api_bp.route('/models', methods=['GET', 'POST'])
 @load_tables
@@ -179,135 +362,268 @@ def api_index():
 def api_models():
     match request.method:
         case "GET":
+            if request.args.get("summary") in ("1", "true"):
+                summary = _models_summary(estimate=request.args.get("estimate") in ("1", "true"))
+                return json_response(summary)
+            mode, error = _stream_mode()
+            if error:
+                return json_response(error), 403
+            if mode is not None:
+                def sections():
+                    for model, model_class in list(model_dict.items()):
+                        plan = serializer_plan(model_class)
+                        rows = db.session.query(model_class).options(*plan.loader_options()).order_by(model_class.id).yield_per(Config.API_STREAM_BATCH)
+                        yield model, rows, plan
+                return _stream_response(sections(), mode, named=True)
             response = []
-            for model, model_class in model_dict.items():
-                rows = db.session.query(model_class).options(*_with_all_rels(model_class)).all()
-                result = {model: [ _model_to_dict(row) for row in rows]}
+            for model, model_class in list(model_dict.items()):
+                plan = serializer_plan(model_class)
+                rows = db.session.query(model_class).options(*plan.loader_options()).all()
+                result = {model: [plan(row) for row in rows]}
                 response.append(result)
-            return Response(json.dumps(response), mimetype='application/json')
+            return json_response(response)
         case "POST":
-            params = parse_qs(unquote_plus(urlparse(request.url).query))
-            format_key = params.get("format", None)
-            if format_key[0] == "json":
-                    params = request.get_json(silent=True)
-            table_name = params.get("table", None)
-            column = params.get("column", None)
-            column_type= params.get("column_type", None)
-            ref = params.get("ref", None)
-            columns = []
-            columns.append(db.Column("id", db.Integer, primary_key=True, autoincrement="auto"))
-            if column_type is None:
-                for item in column:
-                    col, col_type, ref_id= item.split(".", 2)
-                    if ref_id in ["None", "null"]:
-                        columns.append(db.Column(col, column_type_dict.get(col_type, db.Text)))
-                    else:
-                        columns.append(db.Column(col, column_type_dict.get(col_type, db.Text)), db.ForeignKey(ref_id))
-            else:
-                for i in range(len(column)):
-                    if ref[i] in ["None", None]:
-                        columns.append(db.Column(column[i], column_type_dict.get(column_type[i], db.Text)))
-                    else:
-                        columns.append(db.Column(column[i], column_type_dict.get(column_type[i], db.Text)), db.ForeignKey(ref[i]))
-            new_table = db.Table(table_name[0], _metadata, *columns, extend_existing=True)
-            _metadata.create_all(db.engine, tables=[new_table])
-            _register_dynamic_model(table_name[0])
-            return Response(json.dumps({"table": table_name, "created": True, "path": f"/api/model/{inflection.underscore(table_name[0])}"}), mimetype='application/json')
+            parsed = g.parsed
+            if schema_registry.model_key(parsed.table) in model_dict:
+                return json_response({"status": 403, "keys": ["table"], "wrong_value": parsed.table, "reason": "table already exists"}), 403
+            columns = [db.Column("id", db.Integer, primary_key=True, autoincrement="auto")]
+            for spec in parsed.columns:
+                if spec.ref is None:
+                    columns.append(db.Column(spec.name, spec.type))
+                else:
+                    columns.append(db.Column(spec.name, spec.type, db.ForeignKey(spec.ref)))
+            new_table = db.Table(parsed.table, schema_registry.metadata, *columns, extend_existing=True)
+            index_foreign_keys(new_table)
+            schema_registry.metadata.create_all(db.engine, tables=[new_table])
+            schema_registry.register(new_table)
+            return json_response({"table": parsed.params["table"], "created": True, "path": f"/api/model/{inflection.underscore(parsed.table)}"})
     
 
 @api_bp.route('/model/<string:model>', methods=['GET', "POST", "DELETE"])
 @load_tables
 @params_valid
+@cached_response
 def api_model(model):
     model_class = model_dict.get(model)
     match request.method:
         case "GET":
             if model_class:
-                return Response(json.dumps([_model_to_dict(item) for item in db.session.query(model_class).options(*_with_all_rels(model_class)).all()]), mimetype='application/json')
+                mode, error = _stream_mode()
+                if error:
+                    return json_response(error), 403
+                page, error = _page_query(model_class, stream=mode is not None)
+                if error:
+                    return json_response(error), 403
+                query, limit, plan = page
+                if mode is not None:
+                    return _stream_response([(model, query, plan)], mode)
+                rows = query.all()
+                headers = {}
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    headers = _next_page_headers(rows[-1].id)
+                return json_response([plan(item) for item in rows], headers=headers)
             else:
-                return Response(json.dumps([]), mimetype='application/json'), 404
+                return json_response([]), 404
         case "POST":
-            new_row = model_class()
-            new_row.id = len(db.session.query(model_class).all()) + 1
-            params = parse_qs(unquote_plus(urlparse(request.url).query))
-            format_key = params.get("format", None)
-            if format_key[0] == "json":
-                params = request.get_json(silent=True)
-            column = params.get("column", None)
-            value = params.get("value", None)
-            if value is None and column is not None:
-                value = [x.split(".")[1] for x in column]
-                column = [x.split(".")[0] for x in column]
-            attrs = _get_model_attributes(model_class)
-            attrs.remove("id")
-            missing_keys = [x for x in attrs if x not in column]
-            if len(missing_keys) == 0:
-                for i in range(len(column)):
-                    if hasattr(new_row, column[i]):
-                        setattr(new_row, column[i], value[i])
-                try:
-                    db.session.add(new_row)
-                    db.session.commit()
-                except Exception as err:
-                    return Response(json.dumps({"status": 500, "error": err})), 500
-                return Response(json.dumps({f"status": 200, "id": new_row.id, "params": params, "model": _model_to_dict(new_row)})), 200
-            else:
-                return Response(json.dumps({"status": 403, "keys": missing_keys, "reason": "for create new row you should use all keys"})), 403
+            parsed = g.parsed
+            if parsed.rows is not None:
+                return _bulk_create(model_class, parsed.rows)
+            try:
+                new_row = db.session.scalar(insert(model_class).values(parsed.values).returning(model_class))
+                db.session.commit()
+            except Exception as err:
+                db.session.rollback()
+                return json_response({"status": 500, "error": err}), 500
+            return json_response({f"status": 200, "id": new_row.id, "params": parsed.params, "model": serializer_plan(model_class)(new_row)}), 200
         case "DELETE":
             model_class.__table__.drop(db.engine)
-            model_dict.pop(model)
-            return Response(json.dumps({"model": model, "drop": True})), 200
+            schema_registry.unregister(model)
+            return json_response({"model": model, "drop": True}), 200
+
+@api_bp.route('/model/<string:model>/table', methods=['GET'])
+@load_tables
+@params_valid
+def api_model_table(model):
+    model_class = model_dict.get(model)
+    if model_class is None:
+        return json_response({"error": "Not Found"}), 404
+    table, error = _table_query(model_class)
+    if error:
+        return json_response(error), 403
+    query, plan, total, page, per_page = table
+    mapper = inspect(model_class)
+    return json_response({
+        "columns": [prop.key for prop in mapper.column_attrs],
+        "refs": [key for key, _ in plan.refs],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "rows": [plan(item) for item in query],
+    })
+
+@api_bp.route('/model/<string:model>/batch', methods=['POST'])
+@load_tables
+@params_valid
+def api_model_batch(model):
+    model_class = model_dict.get(model)
+    if model_class is None:
+        return json_response({"error": "Not Found"}), 404
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            batch = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            batch = request.get_json()
+    except Exception:
+        return json_response({"status": 403, "keys": ["body"], "reason": "body should be a JSON array or NDJSON"}), 403
+    if isinstance(batch, dict):
+        batch = batch.get("operations")
+    if not isinstance(batch, list):
+        return json_response({"status": 403, "keys": ["operations"], "reason": "body should be a JSON array or NDJSON"}), 403
+    if len(batch) > Config.API_BATCH_LIMIT:
+        return json_response({"status": 403, "keys": ["operations"], "reason": f"at most {Config.API_BATCH_LIMIT} operations per batch"}), 403
+    on = tuple(_split_param("on") or ["id"])
+    wrong = [x for x in on if x not in model_class.__table__.c]
+    if wrong:
+        return json_response({"status": 403, "keys": ["on"], "wrong_value": wrong, "reason": "unknown column"}), 403
+    try:
+        results = apply_batch(model_class, batch, on)
+        db.session.commit()
+    except Exception as err:
+        db.session.rollback()
+        return json_response({"status": 500, "error": err}), 500
+    return json_response({"status": 200, "count": len(results), "results": results}), 200
 
 @api_bp.route('/model/<string:model>/<int:id>', methods=['GET', 'PUT', 'PATCH'])
 @load_tables
 @params_valid
+@cached_response
 def api_model_detail(model, id):
     model_class = model_dict.get(model)
     if model_class:
-        item = model_class().query.get(int(id))
+        item = db.session.get(model_class, id)
     else:
-        return Response(json.dumps({"error": "Not Found"}), mimetype='application/json'), 404
-    params = parse_qs(unquote_plus(urlparse(request.url).query))
-    format_key = params.get("format", None)
-    if format_key is None:
-        pass
-    elif format_key[0] == "json":
-        params = request.get_json(silent=True)
-    column = params.get("column")
-    value = params.get("value")
-    if value is None and column is not None:
-        value = [x.split(".")[1] for x in column]
-        column = [x.split(".")[0] for x in column]
+        return json_response({"error": "Not Found"}), 404
+    if not item:
+        return json_response({"error": "Not exist"}), 404
     match request.method:
         case 'GET':
-            if item:
-                return Response(json.dumps(_model_to_dict(item)), mimetype='application/json')
-            else:
-                return Response(json.dumps({"error": "Not exist"}), mimetype='application/json'), 404
-        case 'PUT':
-            if item:
-                attrs = _get_model_attributes(model_class)
-                attrs.remove("id")
-                missing_keys = [x for x in attrs if x not in column]
-                if len(missing_keys) == 0:
-                    for i in range(len(column)):
-                        if hasattr(item, column[i]):
-                            setattr(item, column[i], value[i])
-                    try:
-                        db.session.commit()
-                    except Exception as err:
-                        return Response(json.dumps({"status": 500, "error": err})), 500
-                    return Response(json.dumps({f"status": 200, "id": item.id, "params": params, "model": _model_to_dict(item)})), 200
-                else:
-                    return Response(json.dumps({"status": 403, "keys": missing_keys, "reason": "for create new row you should use all keys"})), 403
-            else:
-                return Response(json.dumps({"error": "Not exist"}), mimetype='application/json'), 404
-        case 'PATCH':
-            for i in range(len(column)):
-                if hasattr(item, column[i]):
-                    setattr(item, column[i], value[i])
+            return json_response(serializer_plan(model_class, _depth_param())(item))
+        case 'PUT' | 'PATCH':
+            # PUT has been checked to name every column, PATCH any subset.
+            parsed = g.parsed
+            for key, value in parsed.values.items():
+                setattr(item, key, value)
             try:
                 db.session.commit()
             except Exception as err:
-                return Response(json.dumps({"status": 500, "error": err})), 500
-            return Response(json.dumps({f"status": 200, "id": item.id, "params": params, "model": _model_to_dict(item)})), 200
+                db.session.rollback()
+                return json_response({"status": 500, "error": err}), 500
+            return json_response({f"status": 200, "id": item.id, "params": parsed.params, "model": serializer_plan(model_class)(item)}), 200
+
+@api_bp.route('/model/<string:model>/<int:id>/versions', methods=['GET'])
+@load_tables
+@params_valid
+def api_model_versions(model, id):
+    version_class = version_classes.get(model_dict.get(model))
+    if version_class is None:
+        return json_response({"error": "Not Found"}), 404
+    rows = db.session.execute(select(version_class.version, version_class.snapshot).where(version_class.original_id == id).order_by(version_class.version)).all()
+    return json_response({"id": id, "versions": [{"version": row.version, "snapshot": row.snapshot, "path": f"/api/model/{model}/{id}/versions/{row.version}"} for row in rows]})
+
+@api_bp.route('/model/<string:model>/<int:id>/versions/<int:number>', methods=['GET'])
+@load_tables
+@params_valid
+def api_model_version(model, id, number):
+    version_class = version_classes.get(model_dict.get(model))
+    if version_class is None:
+        return json_response({"error": "Not Found"}), 404
+    version = reconstruct(version_class, id, number)
+    if version is None:
+        return json_response({"error": "Not exist"}), 404
+    return json_response(version)
+
+@api_bp.route('/contract/<int:id>/document', methods=['GET'])
+def api_contract_document(id):
+    fmt = request.args.get("format", "docx")
+    if fmt not in formats:
+        return json_response({"status": 403, "keys": ["format"], "wrong_value": fmt, "reason": f"format should be one of {', '.join(formats)}"}), 403
+    try:
+        path, digest = render_contract(id, fmt)
+    except RuntimeError as err:
+        return json_response({"status": 501, "error": str(err)}), 501
+    if path is None:
+        return json_response({"error": "Not exist"}), 404
+    return send_file(path, as_attachment=True, download_name=f"contract_{id}.{fmt}", etag=digest, conditional=True, max_age=0)
+
+@api_bp.route('/image/<string:digest>', methods=['GET'])
+def api_image(digest):
+    # Blobs are content addressed, so the digest is a strong ETag and the
+    # response never changes; send_file handles If-None-Match and Range.
+    if not is_digest(digest):
+        return json_response({"error": "Not Found"}), 404
+    path = blob_path(digest)
+    if not os.path.isfile(path):
+        return json_response({"error": "Not exist"}), 404
+    response = send_file(path, mimetype=content_type(path), etag=digest, conditional=True, max_age=Config.BLOB_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@api_bp.route('/image/<string:digest>/<string:variant>', methods=['GET'])
+def api_image_variant(digest, variant):
+    if not is_digest(digest) or variant not in variants:
+        return json_response({"error": "Not Found"}), 404
+    if not os.path.isfile(blob_path(digest)):
+        return json_response({"error": "Not exist"}), 404
+    path = variant_path(digest, variant)
+    if not os.path.isfile(path):
+        try:
+            path = request_variant(digest, variant).result(timeout=Config.IMAGE_VARIANT_WAIT)
+        except FutureTimeoutError:
+            # Still resizing in the background; the original is correct, just
+            # larger, and the redirect must not be cached.
+            response = redirect(f"/api/image/{digest}", code=307)
+            response.headers["Cache-Control"] = "no-store"
+            return response
+        except Exception as err:
+            return json_response({"status": 415, "error": err}), 415
+    response = send_file(path, mimetype=content_type(path), etag=f"{digest}-{variant}", conditional=True, max_age=Config.BLOB_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@api_bp.route('/choices/<string:role>', methods=['GET'])
+def api_choices(role):
+    provider = providers.get(role)
+    if provider is None:
+        return json_response({"error": "Not Found"}), 404
+    try:
+        limit = min(int(request.args.get("limit", Config.CHOICES_SEARCH_LIMIT)), Config.API_MAX_PAGE_LIMIT)
+    except ValueError:
+        return json_response({"status": 403, "keys": ["limit"], "reason": "limit should be an integer"}), 403
+    matches = provider.search(request.args.get("q", ""), limit)
+    return json_response([{"id": choice.id, "label": choice.label} for choice in matches])
+
+@api_bp.route('/bot/updates', methods=['POST'])
+def api_bot_updates():
+    # Acknowledges as soon as the updates are stored and queued; processing
+    # happens in the bot worker threads (app.bot).
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+    if not Config.BOT_WEBHOOK_SECRET or not hmac.compare_digest(secret, Config.BOT_WEBHOOK_SECRET):
+        return json_response({"status": 403, "reason": "wrong webhook secret"}), 403
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            updates = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            updates = request.get_json()
+    except Exception:
+        return json_response({"status": 403, "reason": "body should be JSON or NDJSON"}), 403
+    if not isinstance(updates, list):
+        updates = [updates]
+    reasons = [validate_update(update) for update in updates]
+    invalid = [{"index": index, "reason": reason} for index, reason in enumerate(reasons) if reason]
+    valid = [update for update, reason in zip(updates, reasons) if reason is None]
+    accepted = update_queue.put(valid)
+    if accepted < len(valid):
+        return json_response({"status": 503, "accepted": accepted, "invalid": invalid, "reason": "update queue is full"}, headers={"Retry-After": "1"}), 503
+    return json_response({"status": 202, "accepted": accepted, "invalid": invalid}), 202
+
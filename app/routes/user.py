@@ -1,17 +1,37 @@
 from flask import render_template, request, redirect, url_for, send_file, session, Blueprint
 
+from app import db
+from ..auth import upsert_telegram_user, verify_telegram
+from ..encoding import json_response
 from ..forms import *
-from ..middleware import admin_required, approve_required
+from ..middleware import admin_required, approve_required, permission_required
 from app.config import Config
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/')
-@approve_required
+@permission_required('user.index')
 def index():
     return render_template('index.html')
 
 
 @user_bp.route('/login')
 def user_login():
-    return render_template('forms/user_login.html')
\ No newline at end of file
+    return render_template('forms/user_login.html')
+
+
+@user_bp.route('/auth/telegram', methods=['POST'])
+def user_auth_telegram():
+    data = request.get_json(silent=True) or request.form.to_dict()
+    if not verify_telegram(data):
+        return json_response({"status": 403, "reason": "telegram authorization failed"}), 403
+    try:
+        user_id, role_id = upsert_telegram_user(data)
+        db.session.commit()
+    except Exception as err:
+        db.session.rollback()
+        return json_response({"status": 500, "error": err}), 500
+    session['user_approved'] = True
+    session['user_id'] = user_id
+    return json_response({"status": 200, "user_id": user_id, "role_id": role_id, "redirect": url_for('user.index')})
+
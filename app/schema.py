@@ -0,0 +1,172 @@
+import hashlib
+import threading
+
+import inflection
+from sqlalchemy import inspect
+from sqlalchemy.orm import registry
+
+from app import db
+from . import response_cache, serializers, validation
+from .metrics import schema_reflections
+from .notify import Listener, notify
+
+
+def _type_name(column_type, dialect):
+    try:
+        return column_type.compile(dialect=dialect)
+    except Exception:
+        return type(column_type).__name__
+
+
+def schema_hash(columns, foreign_keys):
+    # columns: (name, type, nullable); foreign_keys: (columns, table, columns).
+    # Built from reflection or from a Table, so both must normalise the same way.
+    return hashlib.sha256(repr((list(columns), sorted(foreign_keys))).encode()).hexdigest()[:16]
+
+
+def table_hash(table, dialect):
+    columns = [(column.name, _type_name(column.type, dialect), column.nullable) for column in table.columns]
+    foreign_keys = []
+    for constraint in table.foreign_key_constraints:
+        targets = [element.target_fullname.rsplit(".", 1) for element in constraint.elements]
+        foreign_keys.append((tuple(column.name for column in constraint.columns), targets[0][0], tuple(target[1] for target in targets)))
+    return schema_hash(columns, foreign_keys)
+
+
+# Reflects the catalog once at startup and again only when the schema generation
+# changes, either locally (table created/dropped) or via Postgres NOTIFY from
+# another worker. Each dynamic table is mapped through an ORM registry of its
+# own; a class is reused while its table's schema hash stays the same and its
+# registry is disposed of once the table is dropped or altered.
+class SchemaRegistry:
+    channel = "schema_registry"
+
+    def __init__(self, models):
+        self.models = models
+        self.static_models = set(models)
+        # The models' own MetaData, so foreign keys of dynamic tables resolve
+        # against the static tables; the registries are separate so disposing
+        # of dynamic mappers never touches the static ones.
+        self.metadata = db.metadata
+        self._classes = {}
+        self._registries = {}
+        self.generation = 0
+        self._synced_generation = None
+        self._lock = threading.RLock()
+        self._listener = Listener(self.channel, self._remote_change, self._remote_change)
+        self._engine = None
+
+    @staticmethod
+    def model_key(table_name):
+        return table_name.replace("_", "")
+
+    def start(self, app):
+        with app.app_context():
+            self._engine = db.engine
+            self.refresh()
+        self.start_listener()
+
+    def start_listener(self):
+        if self._engine is not None:
+            self._listener.start(self._engine)
+
+    def sync(self):
+        if self._synced_generation != self.generation:
+            self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            generation = self.generation
+            hashes = self._catalog_hashes()
+            for key in [k for k in self.models if k not in self.static_models]:
+                model = self.models[key]
+                if hashes.get(model.__table__.name) != model.__schema_hash__:
+                    self.models.pop(key)
+                    self._dispose(model)
+            for table_name, table_hash in hashes.items():
+                key = self.model_key(table_name)
+                if key not in self.models:
+                    self.models[key] = self._map_table(table_name, table_hash)
+            self._synced_generation = generation
+
+    def _catalog_hashes(self):
+        # Two catalog queries for all tables rather than a reflection each;
+        # only tables whose hash changed are reflected again.
+        inspector = inspect(db.engine)
+        dialect = db.engine.dialect
+        foreign_keys = inspector.get_multi_foreign_keys()
+        hashes = {}
+        for (schema, table_name), columns in inspector.get_multi_columns().items():
+            if self.model_key(table_name) in self.static_models:
+                continue
+            hashes[table_name] = schema_hash(
+                [(column["name"], _type_name(column["type"], dialect), column["nullable"]) for column in columns],
+                [(tuple(fk["constrained_columns"]), fk["referred_table"], tuple(fk["referred_columns"])) for fk in foreign_keys.get((schema, table_name), [])],
+            )
+        return hashes
+
+    def register(self, table):
+        with self._lock:
+            key = self.model_key(table.name)
+            model = self._map_table(table, table_hash(table, db.engine.dialect))
+            previous = self.models.get(key)
+            if previous is not None and previous is not model:
+                self._dispose(previous, keep_table=previous.__table__ is table)
+            self.models[key] = model
+        self._changed()
+        return model
+
+    def unregister(self, key):
+        with self._lock:
+            model = self.models.pop(key, None)
+            self.static_models.discard(key)
+            if model is not None:
+                self._dispose(model)
+        self._changed()
+        return model
+
+    def _map_table(self, table, table_hash):
+        name = table if isinstance(table, str) else table.name
+        model = self._classes.get((name, table_hash))
+        if model is not None:
+            return model
+        if isinstance(table, str):
+            table = db.Table(table, self.metadata, autoload_with=db.engine, extend_existing=True)
+            schema_reflections.inc()
+        model = type(f"Dynamic{inflection.camelize(name)}", (), {"__table__": table, "__schema_hash__": table_hash})
+        self._registries[model] = registry(metadata=self.metadata)
+        self._registries[model].map_imperatively(model, table)
+        self._classes[(name, table_hash)] = model
+        return model
+
+    def _dispose(self, model, keep_table=False):
+        # Per-model caches are keyed by class, so they are cleared for static
+        # models too; only dynamic classes have a mapper of ours to dispose.
+        serializers.forget_model(model)
+        response_cache.forget_model(model)
+        validation.forget_model(model)
+        table = model.__table__
+        if self._classes.get((table.name, getattr(model, "__schema_hash__", None))) is not model:
+            return
+        del self._classes[(table.name, model.__schema_hash__)]
+        self._registries.pop(model).dispose()
+        if not keep_table and self.metadata.tables.get(table.key) is table:
+            self.metadata.remove(table)
+
+    def _changed(self):
+        with self._lock:
+            in_sync = self._synced_generation == self.generation
+            self.generation += 1
+            if in_sync:
+                self._synced_generation = self.generation
+        self._notify()
+
+    def _notify(self):
+        if db.engine.dialect.name == "postgresql":
+            notify(db.engine, self.channel, self.generation)
+
+    def _remote_change(self, message=None):
+        # Called for other workers' notifications and after a reconnect, when
+        # notifications may have been missed.
+        with self._lock:
+            self.generation += 1
@@ -0,0 +1,118 @@
+import datetime
+import decimal
+import threading
+import uuid
+from operator import attrgetter
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import MANYTOONE, load_only, selectinload
+
+from .cache import LRUCache
+from .config import Config
+from .metrics import count_serialized
+
+# model class -> LRUCache of its plans by (depth, fields, expand).
+_plans = {}
+_plans_lock = threading.RLock()
+
+
+# Types the response encoder (app.encoding) writes natively are passed through
+# untouched; anything else falls back to str().
+_native_types = (int, float, str, bool, datetime.datetime, datetime.date, datetime.time, decimal.Decimal, uuid.UUID)
+
+
+def _column_converter(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return str
+    if issubclass(python_type, _native_types):
+        return None
+    return str
+
+
+class SerializerPlan:
+    # Precomputed per (model, depth, fields, expand): columns are read through
+    # attrgetters, relationships are either nested plans or {"id": fk} refs.
+    def __init__(self, model_class, depth, fields=None, expand=None):
+        mapper = inspect(model_class)
+        self.model_class = model_class
+        self.depth = depth
+        self.fields = fields
+        self.columns = []
+        self.refs = []
+        self.nested = []
+        for prop in mapper.column_attrs:
+            if fields is not None and prop.key not in fields:
+                continue
+            self.columns.append((prop.key, attrgetter(prop.key), _column_converter(prop.columns[0])))
+        for rel in mapper.relationships:
+            if depth > 0 and (expand is None or rel.key in expand):
+                self.nested.append((rel.key, rel.uselist, serializer_plan(rel.mapper.class_, depth - 1)))
+            elif rel.direction is MANYTOONE and len(rel.local_columns) == 1:
+                local_key = mapper.get_property_by_column(next(iter(rel.local_columns))).key
+                if fields is None or local_key in fields:
+                    self.refs.append((rel.key, attrgetter(local_key)))
+
+    def __call__(self, obj):
+        if obj is None:
+            return None
+        count_serialized()
+        result = {}
+        for key, getter, convert in self.columns:
+            value = getter(obj)
+            result[key] = value if convert is None or value is None else convert(value)
+        for key, getter in self.refs:
+            value = getter(obj)
+            result[key] = None if value is None else {"id": value}
+        for key, uselist, child in self.nested:
+            value = getattr(obj, key)
+            if value is None:
+                result[key] = None
+            elif uselist:
+                result[key] = [child(item) for item in value]
+            else:
+                result[key] = child(value)
+        return result
+
+    def loader_options(self):
+        options = []
+        if self.fields is not None:
+            options.append(load_only(*[getattr(self.model_class, key) for key, _, _ in self.columns]))
+        options.extend(self._relationship_loaders())
+        return options
+
+    def _relationship_loaders(self):
+        loaders = []
+        for key, _, child in self.nested:
+            loader = selectinload(getattr(self.model_class, key))
+            nested = child._relationship_loaders()
+            loaders.append(loader.options(*nested) if nested else loader)
+        return loaders
+
+
+def _normalize(names, known):
+    # Unknown names are dropped and the rest sorted, so requests that differ
+    # only in order or repetition share one plan.
+    return None if names is None else tuple(sorted(set(names) & known))
+
+
+def serializer_plan(model_class, depth=1, fields=None, expand=None):
+    mapper = inspect(model_class)
+    fields = _normalize(fields, set(mapper.column_attrs.keys()))
+    expand = _normalize(expand, set(mapper.relationships.keys())) if depth > 0 else None
+    key = (depth, fields, expand)
+    plans = _plans.get(model_class)
+    if plans is None:
+        with _plans_lock:
+            plans = _plans.setdefault(model_class, LRUCache(Config.API_PLAN_CACHE_SIZE))
+    plan = plans.get(key)
+    if plan is None:
+        plan = SerializerPlan(model_class, depth, fields, expand)
+        plans.set(key, plan)
+    return plan
+
+
+def forget_model(model_class):
+    with _plans_lock:
+        _plans.pop(model_class, None)
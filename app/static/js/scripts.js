@@ -1,5 +1,5 @@
 async function renderModelCardsDashboard() {
-  const response = await fetch('/api/models');
+  const response = await fetch('/api/models?summary=1');
   if (!response.ok) throw new Error('Failed to fetch models');
   const models = await response.json();
 
@@ -10,43 +10,144 @@ async function renderModelCardsDashboard() {
     const card = document.createElement('div');
     card.className = 'model-card';
     card.innerHTML = `
-      <h3><a href="/admin/dashboard/${modelName}">${modelName}</a> - ${modelData} entities</h3>
+      <h3><a href="/admin/dashboard/${modelName}">${modelName}</a> - ${modelData.count} entities</h3>
     `;
     dashboard.appendChild(card);
   });
 }
 
-async function renderModelTableDashboard() {
-  const response = await fetch(`/api/model/${location.pathname.split('/').pop(-1)}`);
-  if (!response.ok) throw new Error('Failed to fetch model data');
-  const modelData = await response.json();
+const TABLE_ROW_HEIGHT = 28;
+const TABLE_PAGE_SIZE = 200;
 
+function modelTableCell(model, key, value, refs) {
+  const cell = document.createElement('span');
+  cell.className = 'model-cell';
+  if (refs.includes(key)) {
+    if (value === null) {
+      cell.textContent = `${key.toUpperCase()}.NONE`;
+    } else {
+      const link = document.createElement('a');
+      link.href = `/admin/dashboard/${key}/${value.id}`;
+      link.textContent = `${key.toUpperCase()}.${value.id}`;
+      cell.appendChild(link);
+    }
+  } else if (key === 'id') {
+    const link = document.createElement('a');
+    link.href = `/admin/dashboard/${model}/${value}`;
+    link.textContent = value;
+    cell.appendChild(link);
+  } else {
+    cell.textContent = value === null ? '' : String(value);
+  }
+  return cell;
+}
+
+async function renderModelTableDashboard() {
+  // Sorting, filtering and paging happen in SQL (/api/model/<model>/table);
+  // only the rows inside the scrolled viewport exist in the DOM.
+  const model = location.pathname.split('/').pop();
   const dashboard = document.getElementById('model-table-dashboard');
-  dashboard.innerHTML = '';
+  const state = { sort: 'id', filters: {}, total: 0, columns: [], refs: [], pages: new Map(), loading: new Set(), version: 0 };
 
-  const header = document.createElement('p');
+  const header = document.createElement('div');
   header.className = 'model-header';
-  Object.entries(modelData[0]).forEach(([key, value]) => {
-    header.innerHTML += ` <strong>${key}</strong> `;
-  });
-  dashboard.appendChild(header);
+  const filters = document.createElement('div');
+  filters.className = 'model-filters';
+  const viewport = document.createElement('div');
+  viewport.className = 'model-viewport';
+  viewport.style.cssText = 'height: 70vh; overflow-y: auto; position: relative;';
+  const spacer = document.createElement('div');
+  const rows = document.createElement('div');
+  rows.style.cssText = 'position: absolute; left: 0; right: 0; top: 0;';
+  viewport.append(spacer, rows);
+  const status = document.createElement('p');
+  dashboard.replaceChildren(status, header, filters, viewport);
 
-  modelData.forEach(item => {
-    const modelRow = document.createElement('p');
-    modelRow.className = 'model-row';
-    Object.entries(item).forEach(([key, value]) => {
-      if (typeof(value) === 'object' && value !== null) {
-        if ((value?.id?.toString() ?? 'NONE') === 'NONE') {
-          modelRow.innerHTML += ` ${key.toUpperCase()}.NONE `;
-        } else {
-          modelRow.innerHTML += ` <a href="/admin/dashboard/${key}/${value.id.toString()}">${key.toUpperCase()}.${value.id.toString()}</a> `;
-        }
-      } else {
-        modelRow.innerHTML += ` ${value} `;
+  const gridTemplate = () => `repeat(${state.columns.length + state.refs.length}, minmax(8em, 1fr))`;
+
+  async function fetchPage(page) {
+    const version = state.version;
+    const key = `${version}:${page}`;
+    if (state.pages.has(page) || state.loading.has(key)) return;
+    state.loading.add(key);
+    const params = new URLSearchParams({ page, per_page: TABLE_PAGE_SIZE, sort: state.sort });
+    Object.entries(state.filters).forEach(([key, value]) => { if (value) params.set(`filter.${key}`, value); });
+    try {
+      const response = await fetch(`/api/model/${model}/table?${params}`);
+      if (!response.ok) throw new Error('Failed to fetch model data');
+      const data = await response.json();
+      if (version !== state.version) return;
+      state.columns = data.columns;
+      state.refs = data.refs;
+      state.total = data.total;
+      state.pages.set(page, data.rows);
+      status.textContent = `${data.total} rows`;
+      spacer.style.height = `${data.total * TABLE_ROW_HEIGHT}px`;
+      if (!header.childElementCount) renderHeader();
+      renderRows();
+    } finally {
+      state.loading.delete(key);
+    }
+  }
+
+  function renderHeader() {
+    header.style.cssText = filters.style.cssText = `display: grid; grid-template-columns: ${gridTemplate()};`;
+    [...state.columns, ...state.refs].forEach(key => {
+      const title = document.createElement('strong');
+      title.textContent = key;
+      if (state.columns.includes(key)) {
+        title.style.cursor = 'pointer';
+        title.addEventListener('click', () => reload(state.sort === key ? `-${key}` : key));
       }
+      header.appendChild(title);
+      const input = document.createElement('input');
+      input.placeholder = state.columns.includes(key) ? 'filter' : '';
+      input.disabled = !state.columns.includes(key);
+      let timer;
+      input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(() => { state.filters[key] = input.value; reload(state.sort); }, 300);
+      });
+      filters.appendChild(input);
     });
-    dashboard.appendChild(modelRow);
+  }
+
+  function renderRows() {
+    const first = Math.floor(viewport.scrollTop / TABLE_ROW_HEIGHT);
+    const count = Math.ceil(viewport.clientHeight / TABLE_ROW_HEIGHT) + 10;
+    const last = Math.min(first + count, state.total);
+    const fragment = document.createDocumentFragment();
+    for (let index = first; index < last; index++) {
+      const page = Math.floor(index / TABLE_PAGE_SIZE) + 1;
+      const item = state.pages.get(page)?.[index % TABLE_PAGE_SIZE];
+      const row = document.createElement('div');
+      row.className = 'model-row';
+      row.style.cssText = `display: grid; grid-template-columns: ${gridTemplate()}; height: ${TABLE_ROW_HEIGHT}px; overflow: hidden; white-space: nowrap;`;
+      if (item === undefined) {
+        fetchPage(page);
+        row.textContent = '…';
+      } else {
+        [...state.columns, ...state.refs].forEach(key => row.appendChild(modelTableCell(model, key, item[key] ?? null, state.refs)));
+      }
+      fragment.appendChild(row);
+    }
+    rows.style.transform = `translateY(${first * TABLE_ROW_HEIGHT}px)`;
+    rows.replaceChildren(fragment);
+  }
+
+  function reload(sort) {
+    state.sort = sort;
+    state.version += 1;
+    state.pages.clear();
+    viewport.scrollTop = 0;
+    fetchPage(1);
+  }
+
+  let frame = null;
+  viewport.addEventListener('scroll', () => {
+    if (frame === null) frame = requestAnimationFrame(() => { frame = null; renderRows(); });
   });
+  await fetchPage(1);
 }
 
 async function renderModelInstanceDashboard() {
@@ -0,0 +1,319 @@
+import datetime
+import decimal
+import re
+import threading
+from collections import namedtuple
+
+from flask import request
+from sqlalchemy import inspect
+
+from app import db
+
+column_type_dict = {
+    "int": db.Integer,
+    "text": db.Text,
+    "string": db.Text,
+    "timestamp": db.TIMESTAMP,
+    "datetime": db.DateTime,
+    "date": db.Date
+}
+
+# What a write request was parsed into; params_valid stores it on flask.g so
+# the view never looks at the query string or body again.
+ParsedRequest = namedtuple("ParsedRequest", ["format", "params", "values", "rows", "table", "columns"], defaults=(None, None, None, None))
+ColumnSpec = namedtuple("ColumnSpec", ["name", "type", "ref"])
+
+_identifier = re.compile(r"[A-Za-z_]\w*")
+_list_keys = ("table", "column", "column_type", "ref", "value")
+_true = ("1", "true", "yes", "on")
+_false = ("0", "false", "no", "off")
+
+_validators = {}
+_validators_lock = threading.RLock()
+
+
+def _parse_int(value):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+
+def _parse_float(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return float(value)
+
+
+def _parse_decimal(value):
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return decimal.Decimal(str(value))
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in _true + _false:
+        return value.lower() in _true
+    if value in (0, 1):
+        return bool(value)
+    raise ValueError(value)
+
+
+def _parse_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(value)
+
+
+def _parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+def _parse_text(value):
+    if isinstance(value, (dict, list)):
+        raise ValueError(value)
+    return value if isinstance(value, str) else str(value)
+
+
+_parsers = {
+    int: _parse_int,
+    float: _parse_float,
+    decimal.Decimal: _parse_decimal,
+    bool: _parse_bool,
+    datetime.datetime: _parse_datetime,
+    datetime.date: _parse_date,
+    str: _parse_text,
+}
+
+
+def _column_parser(column):
+    # Types without a Python equivalent (or with one we don't parse) receive
+    # the value as sent and are left to the column's own bind processing.
+    try:
+        return _parsers.get(column.type.python_type)
+    except NotImplementedError:
+        return None
+
+
+def _error(keys, reason, wrong_value=None):
+    error = {"status": 403, "keys": keys, "reason": reason}
+    if wrong_value is not None:
+        error["wrong_value"] = wrong_value
+    return error
+
+
+class ModelValidator:
+    # Compiled once per model from its mapper: every writable column with its
+    # parser and nullability. Full writes (POST, PUT) must name all of them
+    # except columns with a default. The version counter is maintained by the
+    # ORM (version_id_col) and can't be written by clients.
+    def __init__(self, model_class):
+        mapper = inspect(model_class)
+        self.model_class = model_class
+        self.columns = {}
+        self.required = []
+        self.read_only = set()
+        for prop in mapper.column_attrs:
+            column = prop.columns[0]
+            if column.primary_key:
+                continue
+            if mapper.version_id_col is not None and column is mapper.version_id_col:
+                self.read_only.add(prop.key)
+                continue
+            self.columns[prop.key] = (_column_parser(column), column.nullable)
+            if column.default is None and column.server_default is None:
+                self.required.append(prop.key)
+
+    def coerce(self, values, full):
+        read_only = [key for key in values if key in self.read_only]
+        if read_only:
+            return None, _error(read_only, "read-only column")
+        unknown = [key for key in values if key not in self.columns]
+        if unknown:
+            return None, _error(unknown, "unknown column")
+        if full:
+            missing = [key for key in self.required if key not in values]
+            if missing:
+                return None, _error(missing, "for create new row you should use all keys")
+        result, wrong = {}, {}
+        for key, value in values.items():
+            parse, nullable = self.columns[key]
+            if value is None:
+                if not nullable:
+                    wrong[key] = value
+                result[key] = None
+                continue
+            try:
+                result[key] = value if parse is None else parse(value)
+            except (TypeError, ValueError, ArithmeticError):
+                wrong[key] = value
+        if wrong:
+            return None, _error(list(wrong), "value does not match the column type", wrong)
+        return result, None
+
+
+def model_validator(model_class):
+    validator = _validators.get(model_class)
+    if validator is None:
+        with _validators_lock:
+            validator = _validators.get(model_class)
+            if validator is None:
+                validator = _validators[model_class] = ModelValidator(model_class)
+    return validator
+
+
+def forget_model(model_class):
+    with _validators_lock:
+        _validators.pop(model_class, None)
+
+
+def _column_values(params):
+    # Either column=name&value=v pairs or column=name.v tokens.
+    column = params.get("column")
+    value = params.get("value")
+    if column is None:
+        return None, {"status": 403, "missing_keys": ["column"] + (["value"] if value is None else [])}
+    if not all(isinstance(item, str) for item in column):
+        return None, _error(["column"], "<column> values should be strings", column)
+    if value is None:
+        tokens = [item.partition(".") for item in column]
+        wrong = [item for item, (_, dot, _) in zip(column, tokens) if not dot]
+        if wrong:
+            return None, _error(["column"], "without <value> each <column> value should look like name.value", wrong)
+        return {name: token for name, _, token in tokens}, None
+    if len(column) != len(value):
+        return None, _error(["column", "value"], "value lengths not matched to each other.")
+    return dict(zip(column, value)), None
+
+
+def _create_row(parsed, model_class):
+    # One row or a list of rows; each is a full write either way.
+    rows = parsed.params.get("rows")
+    if isinstance(rows, list):
+        validator = model_validator(model_class)
+        coerced = []
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                return None, _error(["rows"], "each row should be an object of column values", index)
+            values, error = validator.coerce(row, full=True)
+            if error:
+                error["row"] = index
+                return None, error
+            coerced.append(values)
+        return parsed._replace(rows=coerced), None
+    return _replace_row(parsed, model_class)
+
+
+def _write_row(parsed, model_class, full):
+    values, error = _column_values(parsed.params)
+    if error:
+        return None, error
+    values, error = model_validator(model_class).coerce(values, full)
+    if error:
+        return None, error
+    return parsed._replace(values=values), None
+
+
+def _replace_row(parsed, model_class):
+    return _write_row(parsed, model_class, full=True)
+
+
+def _update_row(parsed, model_class):
+    return _write_row(parsed, model_class, full=False)
+
+
+def _new_table(parsed, model_class):
+    params = parsed.params
+    table = params.get("table")
+    column = params.get("column")
+    column_type = params.get("column_type")
+    ref = params.get("ref")
+    missing = [key for key, value in (("table", table), ("column", column)) if value is None]
+    if missing:
+        return None, {"status": 403, "missing_keys": missing}
+    if not all(isinstance(item, str) for item in table + column + (column_type or []) + [item for item in ref or [] if item is not None]):
+        return None, _error(["table", "column", "column_type", "ref"], "values should be strings")
+    if len(table) != 1 or not _identifier.fullmatch(table[0]):
+        return None, _error(["table"], "<table> should be a single identifier", table)
+    if any(values is not None and len(values) != len(column) for values in (column_type, ref)):
+        return None, _error(["column", "column_type", "ref"], "value lengths not matched to each other.")
+    refs = ref or [None] * len(column)
+    if column_type is None:
+        # column=Name.type with optional ref=..., or column=Name.type.Ref.id
+        specs = [item.split(".", 2) for item in column]
+        wrong = [item for item, spec in zip(column, specs) if len(spec) not in (2, 3) or (len(spec) == 3 and ref is not None)]
+        if wrong:
+            return None, _error(["column"], "for feature request <column> key should contain in each value only 2 dots! with <ref> only 3", wrong)
+        specs = [spec if len(spec) == 3 else spec + [ref_id] for spec, ref_id in zip(specs, refs)]
+    else:
+        specs = zip(column, column_type, refs)
+    columns = []
+    for name, type_name, ref_id in specs:
+        if not _identifier.fullmatch(name):
+            return None, _error(["column"], "column names should be identifiers", name)
+        if type_name not in column_type_dict:
+            return None, _error(["column_type"], f"<column_type> should be one of {', '.join(column_type_dict)}", type_name)
+        if ref_id in (None, "None", "null"):
+            ref_id = None
+        elif ref_id.count(".") != 1:
+            return None, _error(["ref"], "<ref> should have ID like User.int.Role.id", ref_id)
+        columns.append(ColumnSpec(name, column_type_dict[type_name], ref_id))
+    return parsed._replace(table=table[0], columns=columns), None
+
+
+# Write validators by (endpoint, method). Endpoints listed with None take no
+# parameters beyond format; model routes need the model to exist.
+route_validators = {
+    ("api.api_models", "POST"): (_new_table, False),
+    ("api.api_model", "POST"): (_create_row, True),
+    ("api.api_model", "DELETE"): (None, True),
+    ("api.api_model_detail", "PUT"): (_replace_row, True),
+    ("api.api_model_detail", "PATCH"): (_update_row, True),
+}
+
+# Endpoints that read their own body format; batch operations are coerced
+# through model_validator by apply_batch.
+unparsed_endpoints = {"api.api_model_batch"}
+
+
+def parse_request():
+    # Reads format plus the parameters once: the query string for
+    # format=params, the JSON body for format=json. List keys are always lists.
+    format_key = request.args.get("format")
+    if format_key is None:
+        return None, {"status": 403, "missing_keys": ["format"]}
+    if format_key == "params":
+        params = request.args.to_dict(flat=False)
+    elif format_key == "json":
+        params = request.get_json(silent=True)
+        if not isinstance(params, dict):
+            return None, _error(["body"], "body should be a JSON object")
+        params = {key: [value] if key in _list_keys and not isinstance(value, list) else value for key, value in params.items()}
+    else:
+        return None, {"status": 403, "keys": ["format"], "wrong_value": [format_key], "reason": "wrong_value"}
+    return ParsedRequest(format_key, params), None
+
+
+def validate_request(model_dict):
+    # (parsed, None) for a valid write, (None, (error, status)) otherwise.
+    # Reads and unparsed endpoints return (None, None).
+    if request.method not in ("POST", "PATCH", "PUT", "DELETE") or request.endpoint in unparsed_endpoints:
+        return None, None
+    entry = route_validators.get((request.endpoint, request.method))
+    if entry is None:
+        return None, ({"status": 403, "path": request.path, "reason": "unavailable path to this method"}, 403)
+    validator, needs_model = entry
+    model_class = None
+    if needs_model:
+        model_class = model_dict.get((request.view_args or {}).get("model"))
+        if model_class is None:
+            return None, ({"error": "Not Found"}, 404)
+    parsed, error = parse_request()
+    if error is None and validator is not None:
+        parsed, error = validator(parsed, model_class)
+    if error:
+        return None, (error, 403)
+    return parsed, None
@@ -0,0 +1,115 @@
+import difflib
+import json
+import re
+
+from sqlalchemy import func, select
+from sqlalchemy.inspection import inspect
+
+from app import db
+from .cache import LRUCache
+from .config import Config
+
+_tokens = re.compile(r"\s+|\S+")
+
+version_cache = LRUCache(Config.VERSION_CACHE_SIZE)
+
+
+def _push(ops, op):
+    if ops and type(ops[-1]) is type(op) and (isinstance(op, str) or (ops[-1] > 0) == (op > 0)):
+        ops[-1] += op
+    else:
+        ops.append(op)
+
+
+# A delta is a JSON list applied left to right over the previous content:
+# n > 0 copies n characters, n < 0 skips n characters, a string is inserted.
+def make_delta(old, new):
+    a = _tokens.findall(old)
+    b = _tokens.findall(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            _push(ops, sum(len(token) for token in a[i1:i2]))
+            continue
+        if i2 > i1:
+            _push(ops, -sum(len(token) for token in a[i1:i2]))
+        if j2 > j1:
+            _push(ops, "".join(b[j1:j2]))
+    return json.dumps(ops, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_delta(base, delta):
+    out = []
+    position = 0
+    for op in json.loads(delta):
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.append(base[position:position + op])
+            position += op
+        else:
+            position -= op
+    return "".join(out)
+
+
+def previous_content(obj):
+    history = inspect(obj).attrs.content.history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return None
+
+
+def history_row(obj, previous):
+    # Every VERSION_SNAPSHOT_INTERVAL-th version (and any version whose
+    # previous content is unknown) keeps the full text; the rest store a delta.
+    values = obj.version_values()
+    content = values["content"]
+    interval = max(Config.VERSION_SNAPSHOT_INTERVAL, 1)
+    values.update(snapshot=True, delta=None)
+    if previous is not None and (values["version"] - 1) % interval != 0:
+        delta = make_delta(previous, content)
+        if len(delta) < len(content):
+            values.update(snapshot=False, delta=delta, content=None)
+    return values
+
+
+def rebuild(rows):
+    content = None
+    for row in rows:
+        content = row.content if row.snapshot else apply_delta(content, row.delta)
+    return content
+
+
+def _version_columns(version_class):
+    return (version_class.version, version_class.snapshot, version_class.content, version_class.delta, version_class.name, version_class.number)
+
+
+def reconstruct(version_class, original_id, number):
+    key = (version_class.__tablename__, original_id, number)
+    cached = version_cache.get(key)
+    if cached is not None:
+        return cached
+    previous = version_cache.get((version_class.__tablename__, original_id, number - 1))
+    query = select(*_version_columns(version_class)).where(version_class.original_id == original_id)
+    if previous is not None:
+        rows = db.session.execute(query.where(version_class.version == number)).all()
+        if not rows:
+            return None
+        row = rows[0]
+        content = row.content if row.snapshot else apply_delta(previous["content"], row.delta)
+    else:
+        base = (
+            select(func.max(version_class.version))
+            .where(version_class.original_id == original_id, version_class.snapshot.is_(True), version_class.version <= number)
+            .scalar_subquery()
+        )
+        rows = db.session.execute(query.where(version_class.version >= base, version_class.version <= number).order_by(version_class.version)).all()
+        if not rows or rows[-1].version != number:
+            return None
+        row = rows[-1]
+        content = rebuild(rows)
+    result = {"original_id": original_id, "version": number, "name": row.name, "number": row.number, "content": content}
+    version_cache.set(key, result)
+    return result
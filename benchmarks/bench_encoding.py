@@ -0,0 +1,49 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from faker import Faker
+
+from app.encoding import encoders
+from app.models import Contract
+from app.serializers import serializer_plan
+
+ROWS = 20000
+ROUNDS = 5
+
+
+def seed_contracts(count):
+    Faker.seed(0)
+    fake = Faker()
+    contracts = []
+    for i in range(1, count + 1):
+        date_from = fake.date_between(start_date="-5y", end_date="today")
+        contracts.append(Contract(id=i, client_id=fake.random_int(1, 500), seller_id=fake.random_int(1, 500), date_from=date_from, date_to=fake.date_between(start_date=date_from, end_date="+5y")))
+    return contracts
+
+
+def legacy_dumps(rows):
+    # pre-encoder behaviour: every date is turned into a str before json.dumps
+    return json.dumps([{key: str(value) if not isinstance(value, (int, float, str, bool, dict)) and value is not None else value for key, value in row.items()} for row in rows]).encode()
+
+
+def measure(name, dumps, rows):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        body = dumps(rows)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:>8}: {best * 1000:8.2f} ms  {len(body) / 1024:8.1f} KiB  {len(rows) / best:12.0f} rows/s")
+
+
+if __name__ == '__main__':
+    plan = serializer_plan(Contract, depth=0)
+    rows = [plan(contract) for contract in seed_contracts(ROWS)]
+    print(f"{ROWS} Contract rows, best of {ROUNDS}")
+    measure("legacy", legacy_dumps, rows)
+    for name, dumps in encoders.items():
+        measure(name, dumps, rows)
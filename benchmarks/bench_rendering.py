@@ -0,0 +1,80 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from faker import Faker
+
+from app.config import Config
+from app.rendering import _render_job, cache_path
+
+# Renders synthetic contract contexts without a database so the numbers only
+# reflect document building: serial, across the process pool, then warm.
+
+
+def party(fake):
+    return {"name": fake.company(), "details": [("STIR", fake.numerify("#########")), ("Address", fake.address()), ("Director", fake.name())]}
+
+
+def build_contexts(count, points, annexes):
+    Faker.seed(0)
+    fake = Faker()
+    contexts = []
+    for contract_id in range(1, count + 1):
+        contexts.append({
+            "id": contract_id,
+            "date_from": fake.date(),
+            "date_to": fake.date(),
+            "seller": party(fake),
+            "client": party(fake),
+            "types": [fake.word()],
+            "points": [{"id": i, "number": str(i), "name": fake.sentence(nb_words=4), "content": "\n".join(fake.paragraphs(3)), "images": []} for i in range(1, points + 1)],
+            "annexes": [{"id": i, "number": str(i), "name": fake.sentence(nb_words=4), "content": "\n".join(fake.paragraphs(5)), "images": []} for i in range(1, annexes + 1)],
+        })
+    return contexts
+
+
+def digest(context):
+    return hashlib.sha256(json.dumps(context, sort_keys=True).encode()).hexdigest()
+
+
+def report(label, count, elapsed):
+    print(f"{label:<8} {count} contracts in {elapsed:.2f}s  ({count / elapsed:.1f} contracts/s)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contracts", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=10)
+    parser.add_argument("--annexes", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=Config.RENDER_WORKERS)
+    args = parser.parse_args()
+
+    contexts = build_contexts(args.contracts, args.points, args.annexes)
+    jobs = [(context, digest(context), "docx") for context in contexts]
+    Config.RENDER_CACHE_DIR = tempfile.mkdtemp(prefix="bench_rendering_")
+    try:
+        started = time.perf_counter()
+        for job in jobs:
+            _render_job(job)
+        report("serial", len(jobs), time.perf_counter() - started)
+
+        shutil.rmtree(Config.RENDER_CACHE_DIR)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(_render_job, jobs, chunksize=16))
+        report(f"pool x{args.workers}", len(jobs), time.perf_counter() - started)
+
+        started = time.perf_counter()
+        hits = sum(os.path.exists(cache_path(job_digest, fmt)) for _, job_digest, fmt in jobs)
+        report("warm", hits, time.perf_counter() - started)
+    finally:
+        shutil.rmtree(Config.RENDER_CACHE_DIR, ignore_errors=True)
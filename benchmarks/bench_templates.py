@@ -0,0 +1,60 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from docx import Document
+
+from app.docx_templates import _digests, load_template, template_cache
+from app.rendering import template_values
+
+from bench_rendering import build_contexts
+
+
+def write_template(path, paragraphs):
+    # A realistic template: a few hundred static paragraphs of boilerplate
+    # around the slots a contract type would use.
+    document = Document()
+    document.add_heading("Contract No. {{ contract.id }}", 0)
+    document.add_paragraph("Valid from {{ contract.date_from }} to {{ contract.date_to }}")
+    document.add_paragraph("Seller: {{ seller.name }}\n{{ seller.details }}")
+    document.add_paragraph("Client: {{ client.name }}\n{{ client.details }}")
+    for index in range(paragraphs):
+        document.add_paragraph(f"Clause {index}. " + "Standard terms apply to both parties. " * 8)
+    document.add_paragraph("{{ points }}")
+    document.add_page_break()
+    document.add_paragraph("{{ annexes }}")
+    document.save(path)
+
+
+def run(contexts, path, outdir, cold):
+    started = time.perf_counter()
+    for context in contexts:
+        if cold:
+            template_cache.clear()
+            _digests.clear()
+        load_template(path).render(template_values(context), os.path.join(outdir, f"{context['id']}.docx"))
+    return time.perf_counter() - started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contracts", type=int, default=200)
+    parser.add_argument("--paragraphs", type=int, default=300)
+    args = parser.parse_args()
+
+    contexts = build_contexts(args.contracts, 10, 2)
+    workdir = tempfile.mkdtemp(prefix="bench_templates_")
+    try:
+        path = os.path.join(workdir, "template.docx")
+        write_template(path, args.paragraphs)
+        for label, cold in (("cold", True), ("warm", False)):
+            elapsed = run(contexts, path, workdir, cold)
+            print(f"{label}: {len(contexts)} contracts in {elapsed:.2f}s  ({elapsed / len(contexts) * 1000:.2f} ms/contract)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
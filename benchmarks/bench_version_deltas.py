@@ -0,0 +1,73 @@
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from faker import Faker
+
+from app.config import Config
+from app.versioning import make_delta, rebuild
+
+VERSIONS = 1000
+EDITS_PER_VERSION = 3
+
+
+def edit(content, fake):
+    words = content.split(" ")
+    for _ in range(EDITS_PER_VERSION):
+        position = random.randrange(len(words))
+        choice = random.random()
+        if choice < 0.5:
+            words[position] = fake.word()
+        elif choice < 0.8:
+            words.insert(position, fake.sentence())
+        elif len(words) > 10:
+            del words[position]
+    return " ".join(words)
+
+
+def build_history():
+    random.seed(0)
+    Faker.seed(0)
+    fake = Faker()
+    content = fake.paragraph(nb_sentences=60)
+    contents = []
+    rows = []
+    interval = max(Config.VERSION_SNAPSHOT_INTERVAL, 1)
+    previous = None
+    for version in range(1, VERSIONS + 1):
+        content = edit(content, fake)
+        contents.append(content)
+        row = SimpleNamespace(version=version, snapshot=True, content=content, delta=None)
+        if previous is not None and (version - 1) % interval != 0:
+            delta = make_delta(previous, content)
+            if len(delta) < len(content):
+                row = SimpleNamespace(version=version, snapshot=False, content=None, delta=delta)
+        rows.append(row)
+        previous = content
+    return contents, rows
+
+
+def chain(rows, number):
+    base = max(row.version for row in rows[:number] if row.snapshot)
+    return rows[base - 1:number]
+
+
+if __name__ == '__main__':
+    started = time.perf_counter()
+    contents, rows = build_history()
+    build = time.perf_counter() - started
+    full = sum(len(content.encode()) for content in contents)
+    stored = sum(len((row.content or row.delta).encode()) for row in rows)
+    print(f"{VERSIONS} versions, snapshot every {Config.VERSION_SNAPSHOT_INTERVAL}, delta encode {build / VERSIONS * 1000:.2f} ms/version")
+    print(f"storage: full snapshots {full / 1024:.1f} KiB  snapshots+deltas {stored / 1024:.1f} KiB  ({stored / full:.1%})")
+    for number in (1, VERSIONS // 2, VERSIONS):
+        assert rebuild(chain(rows, number)) == contents[number - 1]
+    started = time.perf_counter()
+    for number in range(1, VERSIONS + 1):
+        rebuild(chain(rows, number))
+    cold = (time.perf_counter() - started) / VERSIONS
+    print(f"reconstruct (cold, from nearest snapshot): {cold * 1000:.3f} ms/version")
@@ -0,0 +1,67 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import event, func, insert, select
+
+from app import create_app, db
+from app.middleware import collect_versions, version_classes, write_versions
+from app.models import ContractPoint, ContractPointVersion
+
+app = create_app()
+
+
+def legacy_listener(mapper, connection, target):
+    # Emulates the old per-object before_update listener: one max() query and
+    # one INSERT for every updated row.
+    last = connection.execute(select(func.max(ContractPointVersion.version)).where(ContractPointVersion.original_id == target.id)).scalar() or 0
+    connection.execute(insert(ContractPointVersion.__table__).values(original_id=target.id, current_id=target.id, version=last + 1, name=target.name, number=target.number, content=target.content))
+
+
+def run(points, edits, legacy):
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    rows = [ContractPoint(name=f"bench {i}", number=str(i), content="Lorem ipsum " * 50) for i in range(points)]
+    db.session.add_all(rows)
+    db.session.commit()
+    if legacy:
+        event.remove(db.session, "before_flush", collect_versions)
+        event.remove(db.session, "after_flush", write_versions)
+        event.listen(ContractPoint, "before_update", legacy_listener)
+    event.listen(db.engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    try:
+        for edit in range(edits // points):
+            for row in rows:
+                row.content = f"Lorem ipsum edit {edit} " * 50
+            db.session.commit()
+    finally:
+        elapsed = time.perf_counter() - started
+        event.remove(db.engine, "before_cursor_execute", count)
+        if legacy:
+            event.remove(ContractPoint, "before_update", legacy_listener)
+            event.listen(db.session, "before_flush", collect_versions)
+            event.listen(db.session, "after_flush", write_versions)
+        ids = [row.id for row in rows]
+        db.session.query(ContractPointVersion).filter(ContractPointVersion.original_id.in_(ids)).delete(synchronize_session=False)
+        db.session.query(ContractPoint).filter(ContractPoint.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+    total = edits // points * points
+    mode = "legacy listener" if legacy else "flush-time bulk"
+    print(f"{mode:>16}: {total} edits in {elapsed:.2f}s  {total / elapsed:8.0f} edits/s  {statements[0] / total:.2f} statements/edit")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Versioning cost for ContractPoint edits.")
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--edits", type=int, default=10000)
+    args = parser.parse_args()
+    with app.app_context():
+        run(args.points, args.edits, legacy=True)
+        run(args.points, args.edits, legacy=False)
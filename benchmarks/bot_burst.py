@@ -0,0 +1,86 @@
+import argparse
+import itertools
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Stand-in for the Telegram bot: fires bursts of webhook updates at
+# /api/bot/updates and reports acknowledgement latency, e.g.:
+#   BOT_WEBHOOK_SECRET=s gunicorn -c gunicorn.conf.py
+#   python benchmarks/bot_burst.py http://127.0.0.1:5000 --secret s
+# Processing progress shows up as bot_updates_total / bot_queue_depth on /metrics.
+
+update_ids = itertools.count(int(time.time() * 1000))
+update_ids_lock = threading.Lock()
+
+
+def make_update(users, contract_ids):
+    with update_ids_lock:
+        update_id = next(update_ids)
+    if contract_ids and random.random() < 0.2:
+        return {"update_id": update_id, "type": "contract", "op": "update", "id": random.choice(contract_ids), "values": {"date_to": "2030-12-31"}}
+    telegram_id = random.randrange(users)
+    return {
+        "update_id": update_id,
+        "type": "user",
+        "user": {"id": telegram_id, "first_name": f"User{telegram_id}", "username": f"user{telegram_id}"},
+    }
+
+
+def send(url, secret, updates):
+    request = urllib.request.Request(url, data=json.dumps(updates).encode(), method="POST", headers={
+        "Content-Type": "application/json",
+        "X-Telegram-Bot-Api-Secret-Token": secret,
+    })
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as err:
+        status = err.code
+    except (urllib.error.URLError, OSError):
+        status = None
+    return status, time.perf_counter() - started
+
+
+def run(base_url, secret, bursts, burst_size, per_request, concurrency, pause, users, contract_ids):
+    url = f"{base_url}/api/bot/updates"
+    latencies, statuses = [], {}
+    sent = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(bursts):
+            requests = [[make_update(users, contract_ids) for _ in range(per_request)] for _ in range(burst_size // per_request)]
+            for status, elapsed in executor.map(lambda updates: send(url, secret, updates), requests):
+                statuses[status] = statuses.get(status, 0) + 1
+                latencies.append(elapsed)
+            sent += sum(len(updates) for updates in requests)
+            time.sleep(pause)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(f"{bursts} bursts of {burst_size} updates ({per_request} per request), concurrency={concurrency}")
+    print(f"updates sent: {sent} in {elapsed:.1f}s  statuses: {statuses}")
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"ack latency ms  p50={quantiles[49] * 1000:.1f}  p95={quantiles[94] * 1000:.1f}  p99={quantiles[98] * 1000:.1f}  max={latencies[-1] * 1000:.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bursty Telegram webhook traffic for the bot update queue.")
+    parser.add_argument("base_url", nargs="?", default="http://127.0.0.1:5000")
+    parser.add_argument("--secret", required=True)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=2000)
+    parser.add_argument("--per-request", type=int, default=1, help="Updates per POST; Telegram sends one.")
+    parser.add_argument("-c", "--concurrency", type=int, default=64)
+    parser.add_argument("--pause", type=float, default=1.0, help="Seconds between bursts.")
+    parser.add_argument("--users", type=int, default=5000, help="Distinct Telegram users to draw from.")
+    parser.add_argument("--contract-id", type=int, action="append", dest="contract_ids", default=[])
+    args = parser.parse_args()
+    run(args.base_url.rstrip("/"), args.secret, args.bursts, args.burst_size, args.per_request, args.concurrency, args.pause, args.users, args.contract_ids)
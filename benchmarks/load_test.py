@@ -0,0 +1,57 @@
+import argparse
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Compare the dev server with the production entry point, e.g.:
+#   python run.py                         -> python benchmarks/load_test.py http://127.0.0.1:5000
+#   gunicorn -c gunicorn.conf.py          -> python benchmarks/load_test.py http://127.0.0.1:5000
+
+PATHS = ["/api/models?summary=1", "/api/model/contract?limit=50", "/api/model/seller?limit=50"]
+
+
+def worker(base_url, paths, deadline, latencies, errors, lock):
+    index = 0
+    while time.perf_counter() < deadline:
+        url = base_url + paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+            ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors.append(elapsed)
+
+
+def run(base_url, paths, concurrency, duration):
+    latencies, errors, lock = [], [], threading.Lock()
+    deadline = time.perf_counter() + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker, base_url, paths, deadline, latencies, errors, lock)
+    latencies.sort()
+    print(f"{base_url}  concurrency={concurrency}  duration={duration}s")
+    print(f"requests: {len(latencies)}  errors: {len(errors)}  req/s: {len(latencies) / duration:.1f}")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(f"latency ms  p50={quantiles[49] * 1000:.1f}  p95={quantiles[94] * 1000:.1f}  p99={quantiles[98] * 1000:.1f}  max={latencies[-1] * 1000:.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Closed-loop HTTP load test for the webapp.")
+    parser.add_argument("base_url", nargs="?", default="http://127.0.0.1:5000")
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("-d", "--duration", type=int, default=30)
+    parser.add_argument("-p", "--path", action="append", dest="paths")
+    args = parser.parse_args()
+    run(args.base_url.rstrip("/"), args.paths or PATHS, args.concurrency, args.duration)
@@ -0,0 +1,61 @@
+import os
+
+from app.config import Config
+
+wsgi_app = "run:app"
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+worker_class = "gthread"
+preload_app = True
+timeout = int(os.getenv('WEB_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('WEB_KEEPALIVE', '5'))
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('WEB_MAX_REQUESTS_JITTER', '500'))
+accesslog = os.getenv('WEB_ACCESSLOG', '-')
+
+
+def on_starting(server):
+    # Runs in the master after the app is preloaded: it serves no requests,
+    # so its pooled connections go back to the database.
+    from app import app, db
+    from app.metrics import clear_process_files
+
+    with app.app_context():
+        db.engine.dispose()
+    clear_process_files()
+
+
+def post_fork(server, worker):
+    # The app is preloaded in the master: drop connections inherited through
+    # fork and restart the listener and bot worker threads, which do not
+    # survive it.
+    from app import app, db
+    from app.auth import start_permission_listener
+    from app.bot import update_queue
+    from app.choices import start_choice_listener
+    from app.metrics import start_flusher
+    from app.middleware import schema_registry
+    from app.response_cache import start_listener
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+        start_listener()
+        start_permission_listener()
+        start_choice_listener()
+    schema_registry.start_listener()
+    update_queue.start_workers()
+    start_flusher()
+
+
+def worker_exit(server, worker):
+    from app.metrics import flush
+
+    flush()
+
+
+def child_exit(server, worker):
+    from app.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
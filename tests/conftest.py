@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+import pytest
+
+# The app builds its engine on import, so the database has to be chosen before
+# anything from app is imported: TEST_DATABASE_URL if set, otherwise a
+# throwaway Postgres from pgserver when it is installed.
+_database_url = os.getenv("TEST_DATABASE_URL")
+if not _database_url:
+    try:
+        import pgserver
+    except ImportError:
+        pgserver = None
+    if pgserver is not None:
+        _server = pgserver.get_server(tempfile.mkdtemp(prefix="contract-test-db-"), cleanup_mode="delete")
+        _database_url = _server.get_uri()
+if _database_url:
+    os.environ["DATABASE_URL"] = _database_url
+os.environ.setdefault("BLOB_DIR", tempfile.mkdtemp(prefix="contract-test-blobs-"))
+os.environ.setdefault("RENDER_CACHE_DIR", tempfile.mkdtemp(prefix="contract-test-render-"))
+os.environ.setdefault("BOT_WORKERS", "0")
+
+
+@pytest.fixture(scope="session")
+def app():
+    if not _database_url:
+        pytest.skip("needs Postgres: set TEST_DATABASE_URL or install pgserver")
+    from app import app as flask_app, create_app
+    create_app()
+    flask_app.config.update(TESTING=True, DEBUG=False)
+    return flask_app
+
+
+@pytest.fixture
+def db(app):
+    from sqlalchemy import text
+
+    from app import db as database
+    from app import response_cache
+    from app.auth import permission_cache
+    from app.choices import invalidate_choices
+    from app.versioning import version_cache
+
+    with app.app_context():
+        yield database
+        database.session.remove()
+        tables = ", ".join(f'"{table.name}"' for table in database.metadata.sorted_tables)
+        database.session.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+        database.session.commit()
+    response_cache.backend.bump_all()
+    permission_cache.clear()
+    invalidate_choices()
+    version_cache.clear()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
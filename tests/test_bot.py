@@ -0,0 +1,47 @@
+import queue
+
+import pytest
+
+from app.bot import replay_updates, update_queue
+from app.config import Config
+from app.models import BotUpdate
+
+HEADERS = {"X-Telegram-Bot-Api-Secret-Token": "secret"}
+
+
+@pytest.fixture
+def webhook(client, monkeypatch):
+    monkeypatch.setattr(Config, "BOT_WEBHOOK_SECRET", "secret")
+    yield client
+    _drain()
+
+
+def _drain():
+    batch = []
+    while True:
+        try:
+            batch.append(update_queue.queue.get_nowait())
+        except queue.Empty:
+            return batch
+
+
+def test_retries_are_deduplicated_in_the_database(webhook, db):
+    update = {"update_id": 7, "type": "contract", "op": "delete", "id": 1}
+    assert webhook.post("/api/bot/updates", json=[update], headers=HEADERS).get_json()["accepted"] == 1
+    assert webhook.post("/api/bot/updates", json=[update, {**update, "update_id": 8}], headers=HEADERS).get_json()["accepted"] == 2
+    assert [item[1]["update_id"] for item in _drain()] == [7, 8]
+    assert db.session.query(BotUpdate).count() == 2
+
+
+def test_failed_batch_keeps_the_failing_update(webhook, db):
+    updates = [
+        {"update_id": 1, "type": "contract", "op": "update", "id": 99, "values": {"date_from": "2024-01-01"}},
+        {"update_id": 2, "type": "contract", "op": "create", "values": {"client_id": 99, "seller_id": 99, "date_from": "2024-01-01", "date_to": "2024-12-31"}},
+    ]
+    webhook.post("/api/bot/updates", json=updates, headers=HEADERS)
+    update_queue.process(_drain())
+    statuses = {row.update_id: (row.status, row.attempts) for row in db.session.query(BotUpdate)}
+    assert statuses == {1: ("processed", 1), 2: ("failed", 1)}
+
+    assert replay_updates(600) == 1
+    assert db.session.get(BotUpdate, 2).attempts == 2
@@ -0,0 +1,34 @@
+import json
+import os
+
+from app import metrics
+from app.config import Config
+
+
+def test_render_sums_worker_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "METRICS_DIR", str(tmp_path))
+    counter = metrics.Counter("test_events_total", "Test events.", labels=("kind",))
+    histogram = metrics.Histogram("test_sizes", "Test sizes.", (1, 10))
+    monkeypatch.setattr(metrics, "registry", [counter, histogram, metrics.Gauge("test_depth", "Test depth.", lambda: 3)])
+    counter.inc("a", amount=2)
+    histogram.observe(5)
+    (tmp_path / "metrics-1.json").write_text(json.dumps({
+        "test_events_total": [[["a"], 3], [["b"], 1]],
+        "test_sizes": [[[], [[1, 0, 0], 0.5]]],
+        "test_depth": [[[], 7]],
+    }))
+
+    text = metrics.render()
+    assert 'test_events_total{kind="a"} 5' in text
+    assert 'test_events_total{kind="b"} 1' in text
+    assert 'test_sizes_bucket{le="1"} 1' in text
+    assert 'test_sizes_bucket{le="10"} 2' in text
+    assert 'test_sizes_count 2' in text
+    assert 'test_depth{pid="1"} 7' in text
+    assert f'test_depth{{pid="{os.getpid()}"}} 3' in text
+
+    metrics.mark_process_dead(1)
+    assert not (tmp_path / "metrics-1.json").exists()
+    text = metrics.render()
+    assert 'test_events_total{kind="a"} 5' in text
+    assert 'pid="1"' not in text
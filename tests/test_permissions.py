@@ -0,0 +1,43 @@
+import datetime
+import time
+
+from sqlalchemy import text
+
+from app.auth import permission_cache
+from app.choices import providers
+from app.models import Permission, Role, TelegramID, User
+
+
+def test_user_index_requires_permission(client, db):
+    assert client.get("/user/").status_code == 302
+
+    role = Role(name="user")
+    telegram = TelegramID(telegram_id="1", first_name="Test", username="test", auth_date=datetime.datetime(2024, 1, 1), hash_value="")
+    user = User(name="Test", role=role, telegramid=telegram)
+    db.session.add(user)
+    db.session.commit()
+    with client.session_transaction() as session:
+        session["user_id"] = user.id
+
+    response = client.get("/user/")
+    assert response.status_code == 403
+    assert response.get_json()["permission"] == "user.index"
+
+    # Granting the permission drops the cached (empty) permission set.
+    db.session.add(Permission(role_id=role.id, name="user.index"))
+    db.session.commit()
+    assert client.get("/user/").status_code == 200
+
+
+def test_other_workers_clear_the_cache(db):
+    # A notification from another process (sender pid 0) empties this
+    # worker's caches as well.
+    permission_cache.set(1, frozenset({"user.index"}))
+    providers["seller"]._choices = []
+    with db.engine.begin() as connection:
+        connection.execute(text("SELECT pg_notify('permission_cache', '0:user'), pg_notify('choices', '0:seller')"))
+    deadline = time.monotonic() + 5
+    while (permission_cache.get(1) is not None or providers["seller"]._choices is not None) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert permission_cache.get(1) is None
+    assert providers["seller"]._choices is None
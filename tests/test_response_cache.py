@@ -0,0 +1,51 @@
+from app import response_cache
+from app.models import Subject
+
+
+def _subject(db, name="Acme"):
+    subject = Subject(name=name)
+    db.session.add(subject)
+    db.session.commit()
+    return subject.id
+
+
+def test_etag_and_not_modified(client, db):
+    subject_id = _subject(db)
+    first = client.get(f"/api/model/subject/{subject_id}")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get(f"/api/model/subject/{subject_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_write_changes_etag(client, db):
+    subject_id = _subject(db)
+    etag = client.get(f"/api/model/subject/{subject_id}").headers["ETag"]
+    assert client.patch(f"/api/model/subject/{subject_id}?format=params&column=name&value=Renamed").status_code == 200
+    response = client.get(f"/api/model/subject/{subject_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["name"] == "Renamed"
+    assert response.headers["ETag"] != etag
+
+
+def test_related_write_invalidates_listing(client, db):
+    subject_id = _subject(db)
+    etag = client.get("/api/model/subject").headers["ETag"]
+    db.session.add(Subject(name="Other"))
+    db.session.commit()
+    response = client.get("/api/model/subject", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 2
+
+
+def test_etag_does_not_repeat_after_restart(client, db, monkeypatch):
+    # Each fresh backend stands for a new process (restart, recycled worker)
+    # that starts its generations over.
+    subject_id = _subject(db)
+    monkeypatch.setattr(response_cache, "backend", response_cache.LocalBackend(16))
+    etag = client.get(f"/api/model/subject/{subject_id}").headers["ETag"]
+    db.session.get(Subject, subject_id).name = "Changed"
+    db.session.commit()
+    monkeypatch.setattr(response_cache, "backend", response_cache.LocalBackend(16))
+    response = client.get(f"/api/model/subject/{subject_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["name"] == "Changed"
@@ -0,0 +1,19 @@
+from app import serializers
+from app.config import Config
+from app.models import Seller
+from app.serializers import serializer_plan
+
+
+def test_plan_key_ignores_order_and_repetition(db):
+    plan = serializer_plan(Seller, 1, ["subject_id", "id"], ["subject"])
+    assert serializer_plan(Seller, 1, ["id", "subject_id", "id"], ["subject", "subject"]) is plan
+    assert serializer_plan(Seller, 1, ["id", "subject_id", "nope"], ["subject"]) is plan
+
+
+def test_plan_cache_is_bounded(db, monkeypatch):
+    monkeypatch.setattr(Config, "API_PLAN_CACHE_SIZE", 4)
+    serializers.forget_model(Seller)
+    for depth in range(10):
+        serializer_plan(Seller, depth)
+    assert len(serializers._plans[Seller]) == 4
+    serializers.forget_model(Seller)
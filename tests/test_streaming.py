@@ -0,0 +1,53 @@
+import json
+
+from app.cache import _invalidators
+from app.models import Seller, Subject
+
+
+def _seed(db, count):
+    subjects = [Subject(name=f"Subject {index}") for index in range(count)]
+    db.session.add_all(subjects)
+    db.session.flush()
+    db.session.add_all([Seller(subject_id=subject.id) for subject in subjects])
+    db.session.commit()
+
+
+def test_stream_json_with_relationships(client, db):
+    _seed(db, 3)
+    response = client.get("/api/model/seller?stream=json")
+    assert response.status_code == 200
+    rows = json.loads(response.get_data())
+    assert [row["subject"]["name"] for row in rows] == ["Subject 0", "Subject 1", "Subject 2"]
+
+
+def test_stream_ndjson_matches_paged_listing(client, db):
+    _seed(db, 3)
+    streamed = [json.loads(line) for line in client.get("/api/model/seller?stream=ndjson").get_data(as_text=True).splitlines()]
+    paged = client.get("/api/model/seller").get_json()
+    assert streamed == paged
+
+
+def test_stream_all_models(client, db):
+    _seed(db, 2)
+    response = client.get("/api/models?stream=ndjson")
+    assert response.status_code == 200
+    sections = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sum(1 for item in sections if item["model"] == "seller") == 2
+
+
+def test_stream_rejects_unknown_mode(client, db):
+    assert client.get("/api/model/seller?stream=xml").status_code == 403
+
+
+def test_commit_reports_written_tables(db):
+    written = []
+    _invalidators.append((None, written.append))
+    try:
+        _seed(db, 1)
+        db.session.add(Subject(name="rolled back"))
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()
+    finally:
+        _invalidators.remove((None, written.append))
+    assert written == [{"subject", "seller"}]
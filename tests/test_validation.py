@@ -0,0 +1,59 @@
+from app.models import ContractPoint, Seller, Subject
+
+
+def _subject(db):
+    subject = Subject(name="Acme")
+    db.session.add(subject)
+    db.session.commit()
+    return subject.id
+
+
+def test_single_row_values_are_coerced(client, db):
+    subject_id = _subject(db)
+    response = client.post("/api/model/seller", query_string={"format": "params", "column": "subject_id", "value": str(subject_id)})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["model"]["subject_id"] == subject_id
+
+    response = client.post("/api/model/seller?format=json", json={"column": ["subject_id"], "value": ["x"]})
+    assert response.status_code == 403
+    assert response.get_json()["wrong_value"] == {"subject_id": "x"}
+
+
+def test_bulk_rows_follow_the_single_row_rule(client, db):
+    subject_id = _subject(db)
+    response = client.post("/api/model/contractpoint?format=json", json={"rows": [{"name": "a", "number": "1", "content": "x"}, {"name": "b"}]})
+    assert response.status_code == 403
+    assert response.get_json()["row"] == 1
+    assert sorted(response.get_json()["keys"]) == ["content", "number"]
+
+    response = client.post("/api/model/seller?format=json", json={"rows": [{"subject_id": str(subject_id)}]})
+    assert response.status_code == 200, response.get_json()
+    assert db.session.get(Seller, response.get_json()["ids"][0]).subject_id == subject_id
+
+
+def test_batch_operations_are_validated(client, db):
+    subject_id = _subject(db)
+    response = client.post("/api/model/seller/batch", json=[
+        {"op": "create", "values": {"subject_id": str(subject_id)}},
+        {"op": "create", "values": {"subject_id": "x"}},
+        {"op": "update", "id": 1, "values": {"subject_id": None}},
+    ])
+    assert response.status_code == 200, response.get_json()
+    created, wrong_type, not_null = response.get_json()["results"]
+    assert created["status"] == "created"
+    assert db.session.get(Seller, created["id"]).subject_id == subject_id
+    assert (wrong_type["status"], wrong_type["keys"]) == ("invalid", ["subject_id"])
+    assert (not_null["status"], not_null["keys"]) == ("invalid", ["subject_id"])
+
+
+def test_batch_rejects_version_counter(client, db):
+    point = ContractPoint(name="Payment", number="1", content="draft")
+    db.session.add(point)
+    db.session.commit()
+    response = client.post("/api/model/contractpoint/batch", json=[
+        {"op": "update", "id": point.id, "values": {"version_counter": 7}},
+        {"op": "create", "values": {"name": "Delivery"}},
+    ])
+    read_only, missing = response.get_json()["results"]
+    assert (read_only["status"], read_only["keys"]) == ("invalid", ["version_counter"])
+    assert (missing["status"], sorted(missing["keys"])) == ("invalid", ["content", "number"])
@@ -0,0 +1,51 @@
+from app.models import ContractPoint
+from app.versioning import apply_delta, make_delta
+
+
+def _write(client, method, path, values):
+    return client.open(path + "?format=json", method=method, json={"column": list(values), "value": list(values.values())})
+
+
+def _create_point(client, content="first draft"):
+    response = _write(client, "POST", "/api/model/contractpoint", {"name": "Payment", "number": "1", "content": content})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["id"]
+
+
+def test_delta_round_trip():
+    old = "The seller delivers the goods within ten days."
+    new = "The seller delivers the goods and invoice within five days."
+    assert apply_delta(old, make_delta(old, new)) == new
+
+
+def test_create_does_not_need_version_counter(client, db):
+    point_id = _create_point(client)
+    assert db.session.get(ContractPoint, point_id).version_counter == 1
+
+
+def test_put_does_not_need_version_counter(client, db):
+    point_id = _create_point(client)
+    response = _write(client, "PUT", f"/api/model/contractpoint/{point_id}", {"name": "Payment", "number": "1", "content": "second draft"})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["model"]["version_counter"] == 2
+
+
+def test_version_counter_is_read_only(client, db):
+    point_id = _create_point(client)
+    response = _write(client, "PATCH", f"/api/model/contractpoint/{point_id}", {"content": "edit", "version_counter": 1})
+    assert response.status_code == 403
+    assert response.get_json()["keys"] == ["version_counter"]
+
+
+def test_patches_keep_history(client, db):
+    point_id = _create_point(client)
+    drafts = ["first draft", "second draft", "second draft, amended", "third draft"]
+    for content in drafts[1:]:
+        assert _write(client, "PATCH", f"/api/model/contractpoint/{point_id}", {"content": content}).status_code == 200
+    history = client.get(f"/api/model/contractpoint/{point_id}/versions").get_json()
+    assert [item["version"] for item in history["versions"]] == [1, 2, 3]
+    # Version n holds the point as saved by its n-th edit.
+    for number, content in enumerate(drafts[1:], start=1):
+        version = client.get(f"/api/model/contractpoint/{point_id}/versions/{number}").get_json()
+        assert version["content"] == content
+    assert client.get(f"/api/model/contractpoint/{point_id}").get_json()["content"] == drafts[-1]